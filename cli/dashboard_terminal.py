@@ -5,6 +5,7 @@ from __future__ import annotations
 from datetime import datetime
 
 from core.db import fetchall, fetchone
+from core.validator import numeric_date_format
 from paths import ensure_data_dirs
 
 
@@ -66,15 +67,15 @@ def show_farm_totals() -> None:
     print("\nFarm Totals (excluding duplicates)")
     print("=====================================")
     print(f"{'Farm':<22}{'Total':>14}")
-    total_confirmed = 0.0
+    total_confirmed_cents = 0
     for row in rows:
         farm_id = str(row.get("farm_key") or "unknown")
         display_name = str(row.get("farm_name") or farm_id)
-        amount = cents_to_dollars(row.get("total_cents"))
-        total_confirmed += amount
-        print(f"{display_name[:20]:<22}{money(amount):>14}")
+        cents = int(row.get("total_cents") or 0)
+        total_confirmed_cents += cents
+        print(f"{display_name[:20]:<22}{money(cents_to_dollars(cents)):>14}")
     print("=====================================")
-    print(f"{'Total':<22}{money(total_confirmed):>14}")
+    print(f"{'Total':<22}{money(cents_to_dollars(total_confirmed_cents)):>14}")
 
     if manual_n > 0:
         print("-------------------------------------")
@@ -140,18 +141,15 @@ def show_vendor_totals_for_farm(
         """,
         (farm_id,),
     )
-    vendor_totals: dict[str, float] = {}
-    for row in rows:
-        vendor = str(row.get("vendor") or "Unknown Vendor")
-        vendor_totals[vendor] = cents_to_dollars(row.get("total_cents"))
-
-    sorted_vendors = sorted(vendor_totals.items(), key=lambda item: item[1], reverse=True)
     farm_name_row = fetchone("SELECT display_name FROM farms WHERE farm_key = ?", (farm_id,))
     farm_name = (farm_name_row or {}).get("display_name") or farm_id
     print(f"\nVendors for {farm_name} ({farm_id})")
     print("=====================================")
+    # Rows arrive grouped by vendor and ordered by total_cents DESC from SQL.
     overall = 0.0
-    for vendor, amount in sorted_vendors:
+    for row in rows:
+        vendor = str(row.get("vendor") or "Unknown Vendor")
+        amount = cents_to_dollars(row.get("total_cents"))
         overall += amount
         print(f"{vendor[:22]:<22} {money(amount):>12}")
     print("=====================================")
@@ -195,11 +193,12 @@ def format_invoice_date(value: object) -> str:
     raw = str(value or "").strip()
     if not raw:
         return "Unknown"
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y"):
+    fmt = numeric_date_format(raw)
+    if fmt is not None:
         try:
             return datetime.strptime(raw, fmt).strftime("%Y-%m-%d")
         except ValueError:
-            continue
+            pass
     return raw[:10]
 
 
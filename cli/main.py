@@ -1,31 +1,42 @@
 """Entry point and orchestration for the invoice ingestion pipeline."""
 
 import argparse
-import copy
 import datetime
 import hashlib
 import json
+import os
 import re
 import sqlite3
 import sys
+import time
 import traceback
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
+import httpx
+import openai
+import orjson
+
 from config import load_config
-from core.db import execute, fetchone, get_connection, init_db
-from farm_tagger import TagResult, load_farms, tag_document_text
+from core.db import batch_connection, current_connection, fetchone, init_db
+from farm_tagger import TagCandidate, TagResult, load_farms, tag_document_text
 from core.rules import apply_dynamic_rules, load_dynamic_rules
 from llm_parser import (
     LLMParseError,
+    cached_vision_text,
+    collect_batch_results,
     extract_invoice_text_with_vision,
     parse_invoice_with_llm,
+    submit_structured_batch,
+    submit_vision_batch,
 )
 from core.validator import (
     PARSE_STATUS_INVALID_JSON,
     PARSE_STATUS_SUCCESS,
     PARSE_STATUS_VALIDATION_FAILED,
     normalize_total_to_cents,
+    numeric_date_format,
     validate_invoice_payload,
 )
 from paths import (
@@ -38,51 +49,95 @@ from paths import (
 )
 
 
-CANONICAL_TRANSACTION_SCHEMA = {
-    "doc_id": None,
-    "farm_id": None,
-    "farm_name": None,
-    "vendor_key": None,
-    "vendor_name": None,
-    "invoice_number": None,
-    "invoice_date": None,
-    "due_date": None,
-    "total_amount": None,
-    "service_address": None,
-    "account_number": None,
-    "line_items": [],
-    "raw_text_hash": None,
-    "confidence": 0.0,
-    "needs_manual_review": False,
-    "manual_override": False,
-    "processed_at": None,
-    "error": None,
-    "content_fingerprint": "",
-    "invoice_key": None,
-    "duplicate_detected": False,
-    "duplicate_reason": None,
-    "duplicate_of": None,
-}
-
-REQUIRED_TRANSACTION_KEYS = set(CANONICAL_TRANSACTION_SCHEMA.keys())
+def _new_canonical_record() -> dict:
+    """Return a fresh transaction record with every canonical key at its default."""
+    return {
+        "doc_id": None,
+        "farm_id": None,
+        "farm_name": None,
+        "vendor_key": None,
+        "vendor_name": None,
+        "invoice_number": None,
+        "invoice_date": None,
+        "due_date": None,
+        "total_amount": None,
+        "service_address": None,
+        "account_number": None,
+        "line_items": [],
+        "raw_text_hash": None,
+        "confidence": 0.0,
+        "needs_manual_review": False,
+        "manual_override": False,
+        "processed_at": None,
+        "error": None,
+        "content_fingerprint": "",
+        "invoice_key": None,
+        "duplicate_detected": False,
+        "duplicate_reason": None,
+        "duplicate_of": None,
+    }
+
+
+CANONICAL_TRANSACTION_SCHEMA = _new_canonical_record()
+
+REQUIRED_TRANSACTION_KEYS = frozenset(CANONICAL_TRANSACTION_SCHEMA)
+
+# Vendor keys known to exist in the vendors table: everything inserted by this
+# process, plus the whole table, loaded once when a batch starts. Vendor rows
+# are never deleted, so a key seen once needs no further INSERT OR IGNORE.
+_known_vendor_keys: set[str] = set()
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_IDENTIFIER_SEPARATOR_RE = re.compile(r"[-_/\s]")
+_NON_WORD_RE = re.compile(r"[^\w]")
+_ADDRESS_PUNCT_RE = re.compile(r"[,.]")
+
+
+class _FingerprintTable(dict):
+    """
+    str.translate table mapping every non-word, non-space code point to " ".
+
+    Entries are filled lazily on first sight, using the same character classes
+    as the regex [^\w\s] (str.isalnum, "_" and str.isspace).
+    """
+
+    def __missing__(self, codepoint: int) -> int:
+        char = chr(codepoint)
+        mapped = codepoint if char.isalnum() or char == "_" or char.isspace() else 0x20
+        self[codepoint] = mapped
+        return mapped
+
+
+_FINGERPRINT_TABLE = _FingerprintTable()
+
+# Characters per encode/update step when hashing long OCR text.
+_HASH_CHUNK_CHARS = 1 << 16
 
 
 def hash_text(text: str) -> str:
-    """Generate SHA256 hash of text for deduplication."""
-    return f"sha256:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+    """
+    Generate SHA256 hash of text for deduplication.
+
+    Encodes in fixed-size slices so long OCR text is never duplicated as one
+    full bytes copy; the digest matches hashing the whole encoding at once.
+    """
+    digest = hashlib.sha256()
+    for start in range(0, len(text), _HASH_CHUNK_CHARS):
+        digest.update(text[start:start + _HASH_CHUNK_CHARS].encode("utf-8"))
+    return f"sha256:{digest.hexdigest()[:16]}"
 
 
 def normalize_for_fingerprint(text: str) -> str:
     """
     Normalize text for stable fingerprinting across OCR variations.
 
-    Uses conservative normalization to avoid false positives.
+    Uses conservative normalization to avoid false positives: lowercase,
+    punctuation to spaces in one translate pass, whitespace runs collapsed by
+    split/join.
     """
-    text = (text or "").lower()
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    text = text.strip()
-    return text[:50000]
+    text = (text or "").lower().translate(_FINGERPRINT_TABLE)
+    return " ".join(text.split())[:50000]
 
 
 def compute_content_fingerprint(text: str) -> str:
@@ -96,13 +151,17 @@ def compute_content_fingerprint(text: str) -> str:
     return f"sha256:{hash_full[:16]}"
 
 
+_EMPTY_TEXT_HASH = hash_text("")
+_EMPTY_FINGERPRINT = compute_content_fingerprint("")
+
+
 def norm_identifier(s: str) -> str:
     """Normalize account/invoice identifiers for stable key generation."""
     if not s:
         return ""
     normalized = s.lower().strip()
-    normalized = re.sub(r"[-_/\s]", "", normalized)
-    normalized = re.sub(r"[^\w]", "", normalized)
+    normalized = _IDENTIFIER_SEPARATOR_RE.sub("", normalized)
+    normalized = _NON_WORD_RE.sub("", normalized)
     return normalized
 
 
@@ -114,11 +173,13 @@ def norm_date(date_str: str) -> str:
 
 
 def amount_to_cents(amount: float) -> str:
-    """Convert amount to integer cents string for stable keying."""
-    if amount is None:
-        return "0"
-    cents = int(round(amount * 100))
-    return str(cents)
+    """
+    Convert amount to integer cents string for stable keying.
+
+    Structured parses always carry total_amount as float, and round() on a
+    float already returns int, so no extra int() or Decimal step is needed.
+    """
+    return "0" if amount is None else str(round(amount * 100))
 
 
 def norm_address(address: str) -> str:
@@ -126,8 +187,8 @@ def norm_address(address: str) -> str:
     if not address:
         return ""
     normalized = address.lower().strip()
-    normalized = re.sub(r"\s+", " ", normalized)
-    normalized = re.sub(r"[,.]", "", normalized)
+    normalized = _WHITESPACE_RE.sub(" ", normalized)
+    normalized = _ADDRESS_PUNCT_RE.sub("", normalized)
     return normalized
 
 
@@ -176,12 +237,13 @@ def normalize_date_iso(value: str | None) -> str | None:
     raw = str(value or "").strip()
     if not raw:
         return None
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y"):
-        try:
-            return datetime.datetime.strptime(raw, fmt).date().isoformat()
-        except ValueError:
-            continue
-    return None
+    fmt = numeric_date_format(raw)
+    if fmt is None:
+        return None
+    try:
+        return datetime.datetime.strptime(raw, fmt).date().isoformat()
+    except ValueError:
+        return None
 
 
 def to_cents(value: float | int | None) -> int:
@@ -204,7 +266,7 @@ def insert_document(
 ) -> bool:
     """Insert document and return False on content fingerprint duplicates."""
     try:
-        with get_connection() as connection:
+        with current_connection() as connection:
             connection.execute(
                 """
                 INSERT INTO documents (
@@ -223,6 +285,26 @@ def insert_document(
         raise
 
 
+def _json_text(value: object) -> str:
+    """Serialize a JSON column value with orjson (UTF-8, compact)."""
+    return orjson.dumps(value).decode("utf-8")
+
+
+def _candidate_dict(candidate: TagCandidate) -> dict:
+    """Serializable view of a tag candidate, as stored in the ledger JSON columns."""
+    return {
+        "farm_id": candidate.farm_id,
+        "farm_name": candidate.farm_name,
+        "score": candidate.score,
+        "matched_rules": candidate.matched_rules,
+    }
+
+
+def _top_candidate_dicts(tag_result: TagResult) -> list[dict]:
+    """Candidate dicts for the five best candidates of a tag result."""
+    return [_candidate_dict(c) for c in (tag_result.all_candidates or [])[:5]]
+
+
 def insert_tagging_event(
     doc_id: str,
     tag_result: TagResult,
@@ -236,7 +318,7 @@ def insert_tagging_event(
         "top_score": top.score if top else 0.0,
         "candidate_count": len(tag_result.all_candidates or []),
     }
-    with get_connection() as connection:
+    with current_connection() as connection:
         connection.execute(
             """
             INSERT INTO tagging_events (
@@ -250,29 +332,10 @@ def insert_tagging_event(
                 stage,
                 float(tag_result.confidence or 0.0),
                 1 if bool(tag_result.needs_manual_review) else 0,
-                json.dumps(
-                    {
-                        "farm_id": top.farm_id,
-                        "farm_name": top.farm_name,
-                        "score": top.score,
-                        "matched_rules": top.matched_rules,
-                    }
-                )
-                if top
-                else None,
-                json.dumps(
-                    [
-                        {
-                            "farm_id": c.farm_id,
-                            "farm_name": c.farm_name,
-                            "score": c.score,
-                            "matched_rules": c.matched_rules,
-                        }
-                        for c in (tag_result.all_candidates or [])[:5]
-                    ]
-                ),
+                _json_text(_candidate_dict(top)) if top else None,
+                _json_text(_top_candidate_dicts(tag_result)),
                 tag_result.reason,
-                json.dumps(features),
+                _json_text(features),
             ),
         )
         connection.commit()
@@ -285,16 +348,8 @@ def insert_manual_review_queue(
 ) -> None:
     """Insert manual review queue row."""
     preview = vision_text[:500] + ("..." if len(vision_text) > 500 else "")
-    candidates = [
-        {
-            "farm_id": c.farm_id,
-            "farm_name": c.farm_name,
-            "score": c.score,
-            "matched_rules": c.matched_rules,
-        }
-        for c in (tag_result.all_candidates or [])[:5]
-    ]
-    with get_connection() as connection:
+    candidates = _top_candidate_dicts(tag_result)
+    with current_connection() as connection:
         connection.execute(
             """
             INSERT OR IGNORE INTO manual_review_queue (
@@ -305,7 +360,7 @@ def insert_manual_review_queue(
             (
                 doc_id,
                 preview,
-                json.dumps(candidates, ensure_ascii=False),
+                _json_text(candidates),
                 float(tag_result.confidence or 0.0),
                 tag_result.reason,
             ),
@@ -314,31 +369,35 @@ def insert_manual_review_queue(
 
 
 def insert_transaction_line_items(doc_id: str, line_items: list[dict]) -> None:
-    """Insert parsed transaction line items, if provided."""
+    """Insert parsed transaction line items, if provided, in one executemany."""
     if not line_items:
         return
-    with get_connection() as connection:
-        for idx, item in enumerate(line_items, start=1):
-            if not isinstance(item, dict):
-                continue
-            description = str(
-                item.get("description")
-                or item.get("name")
-                or item.get("item")
-                or ""
-            ).strip()
-            raw_amount = (
-                item.get("amount")
-                if item.get("amount") is not None
-                else item.get("total")
-            )
-            connection.execute(
-                """
-                INSERT INTO transaction_line_items (doc_id, line_number, description, amount_cents)
-                VALUES (?, ?, ?, ?)
-                """,
-                (doc_id, idx, description or None, to_cents(raw_amount)),
-            )
+    rows = []
+    for idx, item in enumerate(line_items, start=1):
+        if not isinstance(item, dict):
+            continue
+        description = str(
+            item.get("description")
+            or item.get("name")
+            or item.get("item")
+            or ""
+        ).strip()
+        raw_amount = (
+            item.get("amount")
+            if item.get("amount") is not None
+            else item.get("total")
+        )
+        rows.append((doc_id, idx, description or None, to_cents(raw_amount)))
+    if not rows:
+        return
+    with current_connection() as connection:
+        connection.executemany(
+            """
+            INSERT INTO transaction_line_items (doc_id, line_number, description, amount_cents)
+            VALUES (?, ?, ?, ?)
+            """,
+            rows,
+        )
         connection.commit()
 
 
@@ -353,24 +412,26 @@ def insert_transaction_record(
     parse_failure_reason: str | None = None,
 ) -> None:
     """Insert transaction row from canonical record."""
-    assert set(record.keys()) >= REQUIRED_TRANSACTION_KEYS, "Transaction schema violation"
+    if not record.keys() >= REQUIRED_TRANSACTION_KEYS:
+        missing = sorted(REQUIRED_TRANSACTION_KEYS - record.keys())
+        raise ValueError(f"Transaction schema violation: missing {missing}")
     vendor_key = record.get("vendor_key")
     vendor_name = record.get("vendor_name")
-    # Ensure vendor exists before inserting transaction (required for FK integrity)
-    if vendor_key:
-        execute(
-            """
-            INSERT OR IGNORE INTO vendors (vendor_key, display_name)
-            VALUES (?, ?)
-            """,
-            (vendor_key, vendor_name or vendor_key),
-        )
     total_cents_val = (
         record["total_cents"]
         if record.get("total_cents") is not None
         else to_cents(record.get("total_amount"))
     )
-    with get_connection() as connection:
+    with current_connection() as connection:
+        # Ensure vendor exists before inserting transaction (required for FK integrity)
+        if vendor_key and vendor_key not in _known_vendor_keys:
+            connection.execute(
+                """
+                INSERT OR IGNORE INTO vendors (vendor_key, display_name)
+                VALUES (?, ?)
+                """,
+                (vendor_key, vendor_name or vendor_key),
+            )
         connection.execute(
             """
             INSERT INTO transactions (
@@ -411,28 +472,64 @@ def insert_transaction_record(
             ),
         )
         connection.commit()
+    if vendor_key:
+        _known_vendor_keys.add(vendor_key)
+
+
+def find_original_doc_id(invoice_key: str | None) -> str | None:
+    """
+    Return the doc_id of the non-duplicate transaction holding invoice_key.
+
+    Probes the unique partial index directly on the current (batch) connection.
+    """
+    with current_connection() as connection:
+        row = connection.execute(
+            """
+            SELECT doc_id
+            FROM transactions
+            WHERE invoice_key = ? AND duplicate_detected = 0
+            LIMIT 1
+            """,
+            (invoice_key,),
+        ).fetchone()
+    return row["doc_id"] if row is not None else None
 
 
 def resolve_vendor_key(farm_id: str, vendor_name: str | None, farms_config: dict) -> str | None:
     """Resolve vendor key from farm config by vendor name (case-insensitive contains)."""
     if not farm_id or not vendor_name or not farms_config:
         return None
-    farms_list = farms_config.get("farms") or []
-    farm = next(
-        (f for f in farms_list if (f.get("id") or f.get("farm_id")) == farm_id),
-        None,
-    )
-    if not farm or "vendors" not in farm:
-        return None
-    vendor_name_lower = (vendor_name or "").lower()
-    for v_key, v_data in (farm.get("vendors") or {}).items():
-        if isinstance(v_data, dict):
-            v_name = (v_data.get("name") or "").lower()
-            if v_name and v_name in vendor_name_lower:
-                return v_key
+    vendor_name_lower = vendor_name.lower()
+    for v_name, v_key in _vendor_index(farms_config).get(farm_id, ()):
+        if v_name in vendor_name_lower:
+            return v_key
     return None
 
 
+# (farms_config, index) for the most recently indexed config; compared by identity.
+_vendor_index_cache: tuple[dict, dict[str, list[tuple[str, str]]]] | None = None
+
+
+def _vendor_index(farms_config: dict) -> dict[str, list[tuple[str, str]]]:
+    """Map farm_id -> [(lowercased vendor name, vendor key)], built once per config object."""
+    global _vendor_index_cache
+    if _vendor_index_cache is not None and _vendor_index_cache[0] is farms_config:
+        return _vendor_index_cache[1]
+    index: dict[str, list[tuple[str, str]]] = {}
+    for farm in farms_config.get("farms") or []:
+        farm_id = farm.get("id") or farm.get("farm_id")
+        if not farm_id or farm_id in index:
+            continue
+        entries = index[farm_id] = []
+        for v_key, v_data in (farm.get("vendors") or {}).items():
+            if isinstance(v_data, dict):
+                v_name = (v_data.get("name") or "").lower()
+                if v_name:
+                    entries.append((v_name, v_key))
+    _vendor_index_cache = (farms_config, index)
+    return index
+
+
 def append_tag_audit(
     doc_id: str,
     pdf_path: str,
@@ -461,15 +558,17 @@ def create_transaction_record(
     vendor_key: str | None = None,
     error: str | None = None,
     manual_override: bool = False,
+    processed_at: str | None = None,
 ) -> dict:
     """
     Create unified transaction record with complete canonical schema.
     Single builder for all execution paths; guarantees identical keys.
+    processed_at defaults to now (UTC ISO-8601).
     """
-    record = copy.deepcopy(CANONICAL_TRANSACTION_SCHEMA)
+    record = _new_canonical_record()
     record["doc_id"] = doc_id
     record["raw_text_hash"] = hash_text(vision_text)
-    record["processed_at"] = datetime.datetime.now(datetime.UTC).isoformat()
+    record["processed_at"] = processed_at or datetime.datetime.now(datetime.UTC).isoformat()
     record["error"] = error
     record["manual_override"] = manual_override
     record["content_fingerprint"] = content_fingerprint
@@ -504,6 +603,27 @@ def create_transaction_record(
     return record
 
 
+def build_error_record(
+    doc_id: str,
+    vision_text: str,
+    content_fingerprint: str,
+    error: str,
+    processed_at: str | None = None,
+) -> dict:
+    """
+    Specialized create_transaction_record for failures before farm tagging:
+    only the identity, hash, and error fields differ from the schema defaults.
+    """
+    record = _new_canonical_record()
+    record["doc_id"] = doc_id
+    record["raw_text_hash"] = hash_text(vision_text) if vision_text else _EMPTY_TEXT_HASH
+    record["processed_at"] = processed_at or datetime.datetime.now(datetime.UTC).isoformat()
+    record["error"] = error
+    record["content_fingerprint"] = content_fingerprint
+    record["needs_manual_review"] = True
+    return record
+
+
 def create_duplicate_stub_record(
     doc_id: str,
     content_fingerprint: str,
@@ -512,13 +632,14 @@ def create_duplicate_stub_record(
     vendor_key: str | None,
     invoice_key: str,
     duplicate_of_doc_id: str | None,
+    processed_at: str | None = None,
 ) -> dict:
     """
     Create a complete canonical audit stub for Layer 2 duplicate detections.
     """
-    record = copy.deepcopy(CANONICAL_TRANSACTION_SCHEMA)
+    record = _new_canonical_record()
     record["doc_id"] = doc_id
-    record["processed_at"] = datetime.datetime.now(datetime.UTC).isoformat()
+    record["processed_at"] = processed_at or datetime.datetime.now(datetime.UTC).isoformat()
     record["content_fingerprint"] = content_fingerprint
     record["invoice_key"] = invoice_key
     record["duplicate_detected"] = True
@@ -541,18 +662,22 @@ def save_invoice_to_json(
     pdf_path: str,
     outputs_dir: str | Path,
 ) -> str:
-    """Save validated invoice data to a JSON file."""
-    output_dir = Path(outputs_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
-    base = Path(pdf_path).name
-    name_without_ext = Path(base).stem
-    json_filename = name_without_ext + ".json"
-    out_path = output_dir / json_filename
-    json_str = json.dumps(invoice_data, indent=2, ensure_ascii=False)
-    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    """
+    Save validated invoice data to a JSON file.
+
+    The output directory is created only when the first write finds it
+    missing (ensure_data_dirs normally has), not stat'ed on every call.
+    """
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    out_path = Path(outputs_dir, stem + ".json")
+    json_bytes = orjson.dumps(invoice_data, option=orjson.OPT_INDENT_2)
+    tmp_path = Path(outputs_dir, stem + ".json.tmp")
     try:
-        with tmp_path.open("w", encoding="utf-8") as f:
-            f.write(json_str)
+        try:
+            tmp_path.write_bytes(json_bytes)
+        except FileNotFoundError:
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(json_bytes)
         tmp_path.replace(out_path)
     except OSError:
         if tmp_path.exists():
@@ -581,19 +706,26 @@ def process_single_invoice(
     config: dict,
     script_dir: str | Path,
     farms_config: dict,
-    outputs_dir: str | Path,
+    outputs_dir: str | Path | None,
     dynamic_rules_config: dict | None = None,
     silent: bool = False,
     verbose: bool = False,
+    vision_error: Exception | None = None,
+    parse_error: Exception | None = None,
 ) -> dict:
     """
     Process single invoice: vision text (cached) -> farm resolution -> tag audit ->
     conditional parse -> unified transaction record. All paths use create_transaction_record.
+    Pass outputs_dir=None to skip the per-invoice structured JSON debug file.
+    vision_error/parse_error carry a batch prefetch failure; that stage fails
+    with it instead of calling the API again.
     """
     doc_id = str(uuid.uuid4())
-    file_name = Path(pdf_path).name
+    # One timestamp for every record this invoice produces.
+    processed_at = datetime.datetime.now(datetime.UTC).isoformat()
+    file_name = os.path.basename(pdf_path)
     api_key = config.get("openai_api_key") or config.get("OPENAI_API_KEY", "")
-    content_fingerprint = compute_content_fingerprint("")
+    content_fingerprint = _EMPTY_FINGERPRINT
 
     if not silent:
         print(f"\n[{file_name}]", end=" ")
@@ -609,8 +741,9 @@ def process_single_invoice(
             content_fingerprint=None,
             raw_text_hash=None,
         )
-        record = create_transaction_record(
+        record = build_error_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             vision_text="",
             content_fingerprint=content_fingerprint,
             error=f"path_validation: {e}",
@@ -621,6 +754,8 @@ def process_single_invoice(
         return {"status": "failed", "reason": "path_validation", "confidence": 0.0}
 
     try:
+        if vision_error is not None:
+            raise vision_error
         vision_text = extract_invoice_text_with_vision(pdf_path, api_key, max_pages=3)
     except Exception as e:
         _print_debug_exception("vision_extraction_failed", e, file_name, verbose)
@@ -631,8 +766,9 @@ def process_single_invoice(
             content_fingerprint=None,
             raw_text_hash=None,
         )
-        record = create_transaction_record(
+        record = build_error_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             vision_text="",
             content_fingerprint=content_fingerprint,
             error=f"vision_extraction_failed: {e}",
@@ -650,8 +786,9 @@ def process_single_invoice(
             content_fingerprint=None,
             raw_text_hash=None,
         )
-        record = create_transaction_record(
+        record = build_error_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             vision_text="",
             content_fingerprint=content_fingerprint,
             error="empty_vision_extraction",
@@ -682,8 +819,9 @@ def process_single_invoice(
             tag_result = tag_document_text(vision_text, farms_config)
     except Exception as e:
         _print_debug_exception("farm_tagging_failed", e, file_name, verbose)
-        record = create_transaction_record(
+        record = build_error_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             vision_text=vision_text,
             content_fingerprint=content_fingerprint,
             error=f"farm_tagging_failed: {e}",
@@ -701,6 +839,8 @@ def process_single_invoice(
     parse_failure_reason_val: str | None = None
 
     try:
+        if parse_error is not None:
+            raise parse_error
         invoice_data = parse_invoice_with_llm(vision_text, api_key)
     except LLMParseError as e:
         _print_debug_exception("llm_parsing_failed", e, doc_id, verbose)
@@ -728,6 +868,7 @@ def process_single_invoice(
     if parse_error_msg is not None:
         record = create_transaction_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             vision_text=vision_text,
             content_fingerprint=content_fingerprint,
             farm_tag_result=tag_result,
@@ -753,6 +894,7 @@ def process_single_invoice(
         append_manual_review_queue(doc_id, vision_text, tag_result)
         record = create_transaction_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             vision_text=vision_text,
             content_fingerprint=content_fingerprint,
             farm_tag_result=tag_result,
@@ -777,6 +919,7 @@ def process_single_invoice(
     invoice_key = compute_invoice_key(vendor_key, invoice_data)
     record = create_transaction_record(
         doc_id=doc_id,
+        processed_at=processed_at,
         vision_text=vision_text,
         content_fingerprint=content_fingerprint,
         farm_tag_result=tag_result,
@@ -795,18 +938,10 @@ def process_single_invoice(
         message = str(exc)
         if "idx_transactions_invoice_key_original" not in message and "transactions.invoice_key" not in message:
             raise
-        original = fetchone(
-            """
-            SELECT doc_id
-            FROM transactions
-            WHERE invoice_key = ? AND duplicate_detected = 0
-            LIMIT 1
-            """,
-            (invoice_key,),
-        )
-        original_doc_id = (original or {}).get("doc_id")
+        original_doc_id = find_original_doc_id(invoice_key)
         stub_record = create_duplicate_stub_record(
             doc_id=doc_id,
+            processed_at=processed_at,
             content_fingerprint=content_fingerprint,
             farm_tag_result=tag_result,
             parsed_invoice=invoice_data,
@@ -836,10 +971,11 @@ def process_single_invoice(
     insert_transaction_line_items(doc_id, record.get("line_items") or [])
 
     saved_path = None
-    try:
-        saved_path = save_invoice_to_json(invoice_data, pdf_path, outputs_dir)
-    except OSError:
-        pass
+    if outputs_dir is not None:
+        try:
+            saved_path = save_invoice_to_json(invoice_data, pdf_path, outputs_dir)
+        except OSError:
+            pass
 
     if not silent:
         farm_label = (tag_result.top_candidate.farm_id or "UNKNOWN").upper()
@@ -856,6 +992,45 @@ def process_single_invoice(
     }
 
 
+def list_pdf_files(directory: Path) -> list[Path]:
+    """
+    Return the directory's *.pdf files sorted by path, or [] if it is missing.
+
+    One os.scandir pass: names and file types come from the directory entries,
+    with no per-file stat. Directories named *.pdf are skipped.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            paths = [entry.path for entry in entries if entry.name.endswith(".pdf") and entry.is_file()]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    return [Path(path) for path in sorted(paths)]
+
+
+def _prefetch_invoice(pdf_path: str, api_key: str) -> tuple[Exception | None, Exception | None]:
+    """
+    Fill the vision and structured caches for one PDF without printing.
+
+    Returns (vision_error, parse_error) for process_single_invoice, so a failed
+    call is recorded rather than repeated. Texts whose content fingerprint is
+    already in the ledger are not parsed; the loop skips them as duplicates.
+    """
+    try:
+        vision_text = extract_invoice_text_with_vision(pdf_path, api_key, max_pages=3, quiet=True).strip()
+    except Exception as e:
+        return e, None
+    if not vision_text or fetchone(
+        "SELECT 1 FROM documents WHERE content_fingerprint = ?",
+        (compute_content_fingerprint(vision_text),),
+    ):
+        return None, None
+    try:
+        parse_invoice_with_llm(vision_text, api_key)
+    except Exception as e:
+        return None, e
+    return None, None
+
+
 def process_batch(
     invoices_dir: str,
     config: dict,
@@ -863,14 +1038,17 @@ def process_batch(
     farms_config: dict,
     dynamic_rules_config: dict | None = None,
     verbose: bool = False,
+    per_file_json: bool = False,
 ) -> dict:
-    """Process all PDFs in invoices directory with vision text and farm resolution."""
-    outputs_dir = STRUCTURED_OUTPUTS_DIR
+    """
+    Process all PDFs in invoices directory with vision text and farm resolution.
+
+    Per-invoice structured JSON files duplicate the ledger, so batch runs skip
+    them unless per_file_json is set.
+    """
+    outputs_dir = STRUCTURED_OUTPUTS_DIR if per_file_json else None
     invoices_path = Path(script_dir) / invoices_dir
-    if not invoices_path.is_dir():
-        pdf_files: list[Path] = []
-    else:
-        pdf_files = sorted(invoices_path.glob("*.pdf"))
+    pdf_files = list_pdf_files(invoices_path)
 
     total = len(pdf_files)
     auto_processed = 0
@@ -892,79 +1070,105 @@ def process_batch(
             "review_queue": 0,
         }
 
-    for i, pdf_path in enumerate(pdf_files):
-        one_indexed = i + 1
-        try:
-            display_path = pdf_path.relative_to(Path(script_dir)).as_posix()
-        except ValueError:
-            display_path = pdf_path.as_posix()
-        print(f"[{one_indexed}/{total}] Processing: {display_path}")
-
-        try:
-            result = process_single_invoice(
-                pdf_path,
-                config,
-                script_dir,
-                farms_config,
-                outputs_dir,
-                dynamic_rules_config=dynamic_rules_config,
-                silent=True,
-                verbose=verbose,
-            )
-        except Exception as e:
-            _print_debug_exception("unexpected_error", e, pdf_path.name, verbose)
-            failed += 1
-            doc_id = str(uuid.uuid4())
-            file_name = pdf_path.name
-            insert_document(
-                doc_id=doc_id,
-                file_name=file_name,
-                file_path=str(pdf_path),
-                content_fingerprint=None,
-                raw_text_hash=None,
-            )
-            record = create_transaction_record(
-                doc_id=doc_id,
-                vision_text="",
-                content_fingerprint=compute_content_fingerprint(""),
-                error=f"unexpected_error: {e}",
-            )
-            insert_transaction_record(record, status="failed", error_reason=record["error"])
-            print(f"  status=failed confidence=0.00 farm=None")
-            continue
-
-        status = result.get("status", "failed")
-        conf = result.get("confidence", 0)
-        if status == "success":
-            auto_processed += 1
-            tx = result.get("transaction")
-            farm_label = (tx.get("farm_id") or "UNKNOWN").upper() if tx else "UNKNOWN"
-            print(f"  status=auto confidence={conf:.2f} farm={farm_label}")
-            if result.get("saved_path"):
-                print(f"  Saved to {Path(result['saved_path']).name}")
-        elif status == "manual_review":
-            manual_review += 1
-            farm_label = "None"
-            if result.get("transaction") and result["transaction"].get("farm_id"):
-                farm_label = (result["transaction"]["farm_id"] or "None").upper()
-            print(f"  status=manual confidence={conf:.2f} farm={farm_label}")
-        elif status == "skipped_duplicate":
-            skipped_duplicates += 1
-            reason = result.get("reason", "unknown")
-            farm_label = "None"
-            tx = result.get("transaction")
-            if tx and tx.get("farm_id"):
-                farm_label = (tx["farm_id"] or "None").upper()
-            if reason == "invoice_key":
-                print(
-                    f"  status=skipped_duplicate reason=invoice_key "
-                    f"confidence={conf:.2f} farm={farm_label}"
-                )
-            else:
-                print("  status=skipped_duplicate reason=content_fingerprint")
-        else:
-            failed += 1
-            print(f"  status=failed confidence={conf:.2f} farm=None")
+    # Worker threads warm the vision and structured caches ahead of the loop,
+    # which handles files in order from cache so ledger writes and progress
+    # output stay sequential. At most two prefetches per worker are in flight,
+    # so an interrupted run does not leave the whole folder queued. Prefetch
+    # errors come back with the file and are recorded by the loop. One ledger
+    # connection serves the whole run instead of one per insert.
+    api_key = config.get("openai_api_key") or config.get("OPENAI_API_KEY", "")
+    max_workers = max(1, int(config.get("max_concurrency", 8)))
+    prefetch_window = max_workers * 2
+    prefetch_pool = ThreadPoolExecutor(max_workers=max_workers)
+    prefetched: dict[int, Future] = {}
+    next_prefetch = 0
+    try:
+        with batch_connection() as connection:
+            _known_vendor_keys.update(row[0] for row in connection.execute("SELECT vendor_key FROM vendors"))
+            script_path = Path(script_dir)
+            for i, pdf_path in enumerate(pdf_files):
+                one_indexed = i + 1
+                while next_prefetch < min(total, i + prefetch_window):
+                    prefetched[next_prefetch] = prefetch_pool.submit(
+                        _prefetch_invoice, str(pdf_files[next_prefetch]), api_key
+                    )
+                    next_prefetch += 1
+                vision_error, parse_error = prefetched.pop(i).result()
+                try:
+                    display_path = pdf_path.relative_to(script_path).as_posix()
+                except ValueError:
+                    display_path = pdf_path.as_posix()
+                print(f"[{one_indexed}/{total}] Processing: {display_path}")
+
+                try:
+                    result = process_single_invoice(
+                        pdf_path,
+                        config,
+                        script_dir,
+                        farms_config,
+                        outputs_dir,
+                        dynamic_rules_config=dynamic_rules_config,
+                        silent=True,
+                        verbose=verbose,
+                        vision_error=vision_error,
+                        parse_error=parse_error,
+                    )
+                except Exception as e:
+                    _print_debug_exception("unexpected_error", e, pdf_path.name, verbose)
+                    failed += 1
+                    doc_id = str(uuid.uuid4())
+                    file_name = pdf_path.name
+                    insert_document(
+                        doc_id=doc_id,
+                        file_name=file_name,
+                        file_path=str(pdf_path),
+                        content_fingerprint=None,
+                        raw_text_hash=None,
+                    )
+                    record = build_error_record(
+                        doc_id=doc_id,
+                        vision_text="",
+                        content_fingerprint=_EMPTY_FINGERPRINT,
+                        error=f"unexpected_error: {e}",
+                    )
+                    insert_transaction_record(record, status="failed", error_reason=record["error"])
+                    print(f"  status=failed confidence=0.00 farm=None")
+                    continue
+
+                status = result.get("status", "failed")
+                conf = result.get("confidence", 0)
+                if status == "success":
+                    auto_processed += 1
+                    tx = result.get("transaction")
+                    farm_label = (tx.get("farm_id") or "UNKNOWN").upper() if tx else "UNKNOWN"
+                    print(f"  status=auto confidence={conf:.2f} farm={farm_label}")
+                    if result.get("saved_path"):
+                        print(f"  Saved to {Path(result['saved_path']).name}")
+                elif status == "manual_review":
+                    manual_review += 1
+                    farm_label = "None"
+                    if result.get("transaction") and result["transaction"].get("farm_id"):
+                        farm_label = (result["transaction"]["farm_id"] or "None").upper()
+                    print(f"  status=manual confidence={conf:.2f} farm={farm_label}")
+                elif status == "skipped_duplicate":
+                    skipped_duplicates += 1
+                    reason = result.get("reason", "unknown")
+                    farm_label = "None"
+                    tx = result.get("transaction")
+                    if tx and tx.get("farm_id"):
+                        farm_label = (tx["farm_id"] or "None").upper()
+                    if reason == "invoice_key":
+                        print(
+                            f"  status=skipped_duplicate reason=invoice_key "
+                            f"confidence={conf:.2f} farm={farm_label}"
+                        )
+                    else:
+                        print("  status=skipped_duplicate reason=content_fingerprint")
+                else:
+                    failed += 1
+                    print(f"  status=failed confidence={conf:.2f} farm=None")
+    finally:
+        prefetch_pool.shutdown(wait=False, cancel_futures=True)
 
     transactions_recorded = auto_processed
     review_queue = manual_review
@@ -994,6 +1198,82 @@ def process_batch(
     }
 
 
+# Below this many PDFs the Batch API's queueing delay outweighs its discount.
+BATCH_API_MIN_FILES = 4
+BATCH_API_POLL_SECONDS = 30
+# Failed polls back off up to this delay; batches complete within 24h or expire.
+BATCH_API_MAX_BACKOFF_SECONDS = 600
+BATCH_API_MAX_WAIT_SECONDS = 24 * 60 * 60
+
+
+def process_batch_via_batch_api(
+    invoices_dir: str,
+    config: dict,
+    script_dir: str | Path,
+    farms_config: dict,
+    dynamic_rules_config: dict | None = None,
+    verbose: bool = False,
+    per_file_json: bool = False,
+) -> dict:
+    """
+    Fill the vision and structured caches through the OpenAI Batch API, then
+    run process_batch against them.
+
+    Batch requests are billed at half price but may take hours; anything the
+    batches did not produce falls through to the synchronous path.
+    """
+    invoices_path = Path(script_dir) / invoices_dir
+    pdf_paths = [str(p) for p in list_pdf_files(invoices_path)]
+    if len(pdf_paths) >= BATCH_API_MIN_FILES:
+        api_key = config.get("openai_api_key") or config.get("OPENAI_API_KEY", "")
+        _wait_for_batch("vision", submit_vision_batch(pdf_paths, api_key, max_pages=3), api_key)
+        ocr_texts = [(cached_vision_text(p) or "").strip() for p in pdf_paths]
+        _wait_for_batch("structured", submit_structured_batch(ocr_texts, api_key), api_key)
+
+    return process_batch(
+        invoices_dir,
+        config,
+        script_dir,
+        farms_config,
+        dynamic_rules_config=dynamic_rules_config,
+        verbose=verbose,
+        per_file_json=per_file_json,
+    )
+
+
+def _wait_for_batch(label: str, batch_id: str | None, api_key: str) -> None:
+    """
+    Poll a submitted batch until it finishes and its results are cached.
+
+    Transient API/network errors are retried with exponential backoff. After
+    BATCH_API_MAX_WAIT_SECONDS the wait is abandoned and the caller's
+    synchronous pass handles whatever is still uncached.
+    """
+    if batch_id is None:
+        return
+    print(f"Submitted {label} batch {batch_id}; waiting for results...")
+    deadline = time.monotonic() + BATCH_API_MAX_WAIT_SECONDS
+    delay = BATCH_API_POLL_SECONDS
+    while True:
+        try:
+            written = collect_batch_results(batch_id, api_key)
+        except LLMParseError as e:
+            print(f"  {label} batch failed: {e}")
+            return
+        except (openai.APIError, httpx.HTTPError) as e:
+            delay = min(delay * 2, BATCH_API_MAX_BACKOFF_SECONDS)
+            print(f"  {label} batch poll failed ({e}); retrying in {delay}s")
+        else:
+            if written is not None:
+                print(f"  {label} batch cached {written} results")
+                return
+            delay = BATCH_API_POLL_SECONDS
+        if time.monotonic() + delay > deadline:
+            print(f"  {label} batch still unfinished; continuing without it")
+            return
+        time.sleep(delay)
+
+
 def main() -> None:
     """Entry point with CLI argument parsing."""
     ensure_data_dirs()
@@ -1012,6 +1292,16 @@ def main() -> None:
         action="store_true",
         help="Process all PDF files in the invoices/ directory",
     )
+    parser.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="With --all, run OCR and parsing through the OpenAI Batch API (cheaper, slower).",
+    )
+    parser.add_argument(
+        "--per-file-json",
+        action="store_true",
+        help="With --all, also write a structured JSON debug file per invoice to data/debug/structured_outputs/.",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -1038,13 +1328,15 @@ def main() -> None:
         sys.exit(1)
 
     if args.all:
-        process_batch(
+        run_batch = process_batch_via_batch_api if args.batch_api else process_batch
+        run_batch(
             "invoices",
             config,
             BASE_DIR,
             farms_config,
             dynamic_rules_config=dynamic_rules_config,
             verbose=args.verbose,
+            per_file_json=args.per_file_json,
         )
         return
 
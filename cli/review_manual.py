@@ -4,14 +4,19 @@ from __future__ import annotations
 
 import argparse
 import datetime
-import json
 import re
 import sys
+from contextlib import closing
 from typing import Any
 
-from core.db import execute, fetchall, fetchone
+import orjson
+
+from core.db import fetchall, get_connection
 from farm_tagger import load_farms
+from llm_parser import legacy_vision_cache_path, vision_cache_path
 from core.rules import (
+    build_farms_config_mappings,
+    build_transaction_mappings,
     check_account_collision,
     ensure_dynamic_rules_file,
     generate_rule_id,
@@ -21,10 +26,19 @@ from core.rules import (
 from paths import (
     DYNAMIC_RULES_PATH,
     FARMS_CONFIG_PATH,
-    VISION_CACHE_DIR,
     ensure_data_dirs,
 )
 
+_ACCOUNT_NUMBER_RES = (
+    re.compile(r"account\s*(?:no|number|#)?\s*[:\-]?\s*([a-z0-9\-]{4,})", re.IGNORECASE),
+    re.compile(r"acct\s*[:\-]?\s*([a-z0-9\-]{4,})", re.IGNORECASE),
+)
+_STREET_TOKEN_RE = re.compile(r"\b(?:rd|road|street|st|ave|blvd|ca)\b")
+# Commas become semicolons so one str.split covers both separators.
+_ADDRESS_SEPARATOR_TABLE = str.maketrans(",", ";")
+_KEYWORD_TOKEN_RE = re.compile(r"[a-z0-9]{4,}")
+_KEYWORD_STOPWORDS = frozenset({"farm", "farms", "expenses", "ranch"})
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -44,7 +58,7 @@ def main() -> None:
 
     try:
         farms_config = load_farms(FARMS_CONFIG_PATH)
-        queue_rows = fetchall(
+        unresolved = fetchall(
             """
             SELECT
                 q.doc_id,
@@ -54,35 +68,11 @@ def main() -> None:
                 q.reason,
                 q.status,
                 q.queued_at,
-                d.file_name
+                d.file_name,
+                d.file_path
             FROM manual_review_queue q
             JOIN documents d ON d.doc_id = q.doc_id
-            """
-        )
-        transactions_rows = fetchall(
-            """
-            SELECT
-                t.doc_id,
-                t.farm_key AS farm_id,
-                t.farm_name,
-                t.vendor_key,
-                t.vendor_name,
-                t.invoice_number,
-                t.invoice_date,
-                t.due_date,
-                (t.total_cents / 100.0) AS total_amount,
-                t.service_address,
-                t.account_number,
-                t.confidence,
-                t.needs_manual_review,
-                t.manual_override,
-                t.error_reason AS error,
-                t.content_fingerprint,
-                t.invoice_key,
-                t.duplicate_detected,
-                t.duplicate_reason,
-                t.duplicate_of_doc_id AS duplicate_of
-            FROM transactions t
+            WHERE q.status = 'open'
             """
         )
         dynamic_rules_payload = ensure_dynamic_rules_file(DYNAMIC_RULES_PATH)
@@ -90,14 +80,49 @@ def main() -> None:
         print(f"Initialization failed: {exc}", file=sys.stderr)
         sys.exit(1)
 
-    unresolved = [
-        row for row in queue_rows if isinstance(row, dict) and str(row.get("status") or "") == "open"
-    ]
     print(f"You have {len(unresolved)} unresolved items")
     if not unresolved:
         return
 
+    transactions_rows = fetchall(
+        """
+        SELECT
+            t.doc_id,
+            t.farm_key AS farm_id,
+            t.farm_name,
+            t.vendor_key,
+            t.vendor_name,
+            t.invoice_number,
+            t.invoice_date,
+            t.due_date,
+            (t.total_cents / 100.0) AS total_amount,
+            t.service_address,
+            t.account_number,
+            t.confidence,
+            t.needs_manual_review,
+            t.manual_override,
+            t.error_reason AS error,
+            t.content_fingerprint,
+            t.invoice_key,
+            t.duplicate_detected,
+            t.duplicate_reason,
+            t.duplicate_of_doc_id AS duplicate_of
+        FROM transactions t
+        """
+    )
+
     farms_lookup = build_farm_lookup(farms_config)
+    rows_by_doc_id = group_rows(transactions_rows, "doc_id")
+    rows_by_fingerprint = group_rows(transactions_rows, "content_fingerprint")
+    vendor_terms = build_vendor_term_table(farms_config)
+    transaction_mappings = build_transaction_mappings(transactions_rows)
+    farms_config_mappings = build_farms_config_mappings(farms_config)
+    # Dry runs never change the rules payload, so its ids can be collected once.
+    dry_run_rule_ids = (
+        {r.get("rule_id") for r in (dynamic_rules_payload.get("rules") or [])}
+        if args.dry_run
+        else set()
+    )
     resolved_count = 0
     accepted_rule_count = 0
 
@@ -115,10 +140,10 @@ def main() -> None:
         candidates = []
         if isinstance(raw_candidates, str) and raw_candidates.strip():
             try:
-                parsed_candidates = json.loads(raw_candidates)
+                parsed_candidates = orjson.loads(raw_candidates)
                 if isinstance(parsed_candidates, list):
                     candidates = parsed_candidates
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 candidates = []
         item["candidates"] = candidates
 
@@ -144,7 +169,7 @@ def main() -> None:
             continue
         selected_farm_id, selected_farm_name = selection
 
-        tx_meta = locate_transaction_for_queue_item(transactions_rows, doc_id)
+        tx_meta = locate_transaction_for_queue_item(rows_by_doc_id, doc_id)
         if tx_meta is None:
             print(
                 "Unable to resolve transaction row for this queue item. "
@@ -174,13 +199,15 @@ def main() -> None:
 
         proposals = propose_dynamic_rules(
             doc_id=doc_id,
-            file_name=file_name,
+            file_path=str(item.get("file_path") or ""),
             selected_farm_id=selected_farm_id,
             selected_farm_name=selected_farm_name,
             transaction_row=tx_meta,
             farms_config=farms_config,
+            vendor_terms=vendor_terms,
             dynamic_rules_payload=dynamic_rules_payload,
-            transactions_rows=transactions_rows,
+            transaction_mappings=transaction_mappings,
+            farms_config_mappings=farms_config_mappings,
         )
 
         accepted_rules: list[dict[str, Any]] = []
@@ -204,108 +231,107 @@ def main() -> None:
             )
             for proposal in accepted_rules:
                 candidate_rule_id = generate_rule_id(proposal)
-                duplicate_exists = any(
-                    r.get("rule_id") == candidate_rule_id
-                    for r in (dynamic_rules_payload.get("rules") or [])
-                )
-                if duplicate_exists:
+                if candidate_rule_id in dry_run_rule_ids:
                     print(f"[DRY-RUN] Rule already exists: {candidate_rule_id}")
                 else:
                     print(f"[DRY-RUN] Would add dynamic rule: {candidate_rule_id}")
             resolved_count += 1
             continue
 
-        execute(
-            """
-            UPDATE manual_review_queue
-            SET status = 'resolved', resolved_at = datetime('now')
-            WHERE doc_id = ?
-            """,
-            (doc_id,),
-        )
-        transaction_meta = fetchone(
-            """
-            SELECT id
-            FROM transactions
-            WHERE content_fingerprint = ?
-            ORDER BY duplicate_detected ASC, id ASC
-            LIMIT 1
-            """,
-            (content_fingerprint,),
-        )
-        if not transaction_meta:
-            print(
-                "Warning: Transaction row update failed by content_fingerprint. "
-                "Queue decision recorded; transaction row unchanged."
-            )
-        else:
-            execute(
+        # One connection and one commit per decision: the queue, transaction,
+        # decision and tagging-event writes land together or not at all.
+        with closing(get_connection()) as connection, connection:
+            connection.execute(
                 """
-                UPDATE transactions
-                SET
-                    farm_key = ?,
-                    farm_name = ?,
-                    needs_manual_review = 0,
-                    manual_override = 1,
-                    status = 'manual',
-                    updated_at = datetime('now')
-                WHERE id = ?
+                UPDATE manual_review_queue
+                SET status = 'resolved', resolved_at = datetime('now')
+                WHERE doc_id = ?
                 """,
-                (selected_farm_id, selected_farm_name, int(transaction_meta["id"])),
+                (doc_id,),
             )
+            transaction_meta = connection.execute(
+                """
+                SELECT id
+                FROM transactions
+                WHERE content_fingerprint = ?
+                ORDER BY duplicate_detected ASC, id ASC
+                LIMIT 1
+                """,
+                (content_fingerprint,),
+            ).fetchone()
+            if not transaction_meta:
+                print(
+                    "Warning: Transaction row update failed by content_fingerprint. "
+                    "Queue decision recorded; transaction row unchanged."
+                )
+            else:
+                connection.execute(
+                    """
+                    UPDATE transactions
+                    SET
+                        farm_key = ?,
+                        farm_name = ?,
+                        needs_manual_review = 0,
+                        manual_override = 1,
+                        status = 'manual',
+                        updated_at = datetime('now')
+                    WHERE id = ?
+                    """,
+                    (selected_farm_id, selected_farm_name, int(transaction_meta["id"])),
+                )
 
-        execute(
-            """
-            INSERT INTO manual_review_decisions (
-                doc_id,
-                content_fingerprint,
-                invoice_key,
-                selected_farm_key,
-                selected_farm_name,
-                decision_source,
-                notes,
-                created_at
+            connection.execute(
+                """
+                INSERT INTO manual_review_decisions (
+                    doc_id,
+                    content_fingerprint,
+                    invoice_key,
+                    selected_farm_key,
+                    selected_farm_name,
+                    decision_source,
+                    notes,
+                    created_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    doc_id,
+                    content_fingerprint,
+                    invoice_key,
+                    selected_farm_id,
+                    selected_farm_name,
+                    "manual_review",
+                    None,
+                    decision["created_at"],
+                ),
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                doc_id,
-                content_fingerprint,
-                invoice_key,
-                selected_farm_id,
-                selected_farm_name,
-                "manual_review",
-                None,
-                datetime.datetime.now(datetime.UTC).isoformat(),
-            ),
-        )
 
-        execute(
-            """
-            INSERT INTO tagging_events (
-                doc_id, stage, confidence, needs_manual_review,
-                top_candidate_json, all_candidates_json, reason, features_json, tagged_at
-            )
-            VALUES (?, 'manual', ?, 0, ?, ?, ?, ?, datetime('now'))
-            """,
-            (
-                doc_id,
-                confidence,
-                json.dumps(
-                    {
-                        "farm_id": selected_farm_id,
-                        "farm_name": selected_farm_name,
-                        "score": None,
-                        "matched_rules": ["manual_review"],
-                    }
+            connection.execute(
+                """
+                INSERT INTO tagging_events (
+                    doc_id, stage, confidence, needs_manual_review,
+                    top_candidate_json, all_candidates_json, reason, features_json, tagged_at
+                )
+                VALUES (?, 'manual', ?, 0, ?, ?, ?, ?, datetime('now'))
+                """,
+                (
+                    doc_id,
+                    confidence,
+                    orjson.dumps(
+                        {
+                            "farm_id": selected_farm_id,
+                            "farm_name": selected_farm_name,
+                            "score": None,
+                            "matched_rules": ["manual_review"],
+                        }
+                    ).decode("utf-8"),
+                    orjson.dumps(item.get("candidates") or []).decode("utf-8"),
+                    "Manual review resolution",
+                    orjson.dumps({"decision_source": "manual_review"}).decode("utf-8"),
                 ),
-                json.dumps(item.get("candidates") or []),
-                "Manual review resolution",
-                json.dumps({"decision_source": "manual_review"}),
-            ),
-        )
+            )
 
-        ambiguous_matches = count_ambiguous_matches(transactions_rows, content_fingerprint, doc_id)
+        ambiguous_matches = count_ambiguous_matches(rows_by_fingerprint, content_fingerprint, doc_id)
         if ambiguous_matches:
             if ambiguous_matches:
                 print(
@@ -314,11 +340,12 @@ def main() -> None:
                 )
 
         for proposal in accepted_rules:
-            created, rule_id = upsert_dynamic_rule(DYNAMIC_RULES_PATH, proposal)
+            created, rule_id = upsert_dynamic_rule(
+                DYNAMIC_RULES_PATH, proposal, payload=dynamic_rules_payload
+            )
             if created:
                 accepted_rule_count += 1
                 print(f"Added dynamic rule: {rule_id}")
-                dynamic_rules_payload = ensure_dynamic_rules_file(DYNAMIC_RULES_PATH)
             else:
                 print(f"Rule already exists: {rule_id}")
 
@@ -384,11 +411,19 @@ def prompt_farm_selection(
         print("Unknown farm_id. Enter a listed candidate number or valid farm_id.")
 
 
+def group_rows(rows: list[dict[str, Any]], key: str) -> dict[Any, list[dict[str, Any]]]:
+    """Group rows by one column in a single pass, keeping row order within each group."""
+    grouped: dict[Any, list[dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault(row.get(key), []).append(row)
+    return grouped
+
+
 def locate_transaction_for_queue_item(
-    transactions_rows: list[dict[str, Any]],
+    rows_by_doc_id: dict[Any, list[dict[str, Any]]],
     doc_id: str,
 ) -> dict[str, Any] | None:
-    matches = [row for row in transactions_rows if row.get("doc_id") == doc_id]
+    matches = rows_by_doc_id.get(doc_id)
     if not matches:
         return None
     non_duplicate = [row for row in matches if not bool(row.get("duplicate_detected"))]
@@ -396,60 +431,60 @@ def locate_transaction_for_queue_item(
 
 
 def count_ambiguous_matches(
-    transactions_rows: list[dict[str, Any]],
+    rows_by_fingerprint: dict[Any, list[dict[str, Any]]],
     content_fingerprint: str,
     doc_id: str,
 ) -> int:
-    matching_indices = [
-        idx
-        for idx, row in enumerate(transactions_rows)
-        if row.get("content_fingerprint") == content_fingerprint
-    ]
-    if not matching_indices:
+    matching_rows = rows_by_fingerprint.get(content_fingerprint)
+    if not matching_rows:
         return 0
 
-    narrowed = [
-        idx for idx in matching_indices if str(transactions_rows[idx].get("doc_id") or "") == doc_id
-    ]
-    candidate_indices = narrowed if narrowed else matching_indices
-    ambiguous_count = len(candidate_indices)
+    narrowed = [row for row in matching_rows if str(row.get("doc_id") or "") == doc_id]
+    candidate_rows = narrowed if narrowed else matching_rows
+    ambiguous_count = len(candidate_rows)
     return ambiguous_count if ambiguous_count > 1 else 0
 
 
 def propose_dynamic_rules(
     doc_id: str,
-    file_name: str,
+    file_path: str,
     selected_farm_id: str,
     selected_farm_name: str,
     transaction_row: dict[str, Any],
     farms_config: dict[str, Any],
+    vendor_terms: list[tuple[str, frozenset[str]]],
     dynamic_rules_payload: dict[str, Any],
-    transactions_rows: list[dict[str, Any]],
+    transaction_mappings: dict[tuple[str, str], set[str]],
+    farms_config_mappings: dict[tuple[str, str], set[str]],
 ) -> list[dict[str, Any]]:
-    ocr_text = load_cached_ocr_text(file_name)
+    ocr_text = load_cached_ocr_text(file_path)
+    # Normalized once here; the whole-text helpers below take it as is. The
+    # whole document is unique per call, so it bypasses the memo cache.
+    normalized_ocr = normalize_text.__wrapped__(ocr_text)
     vendor_key = transaction_row.get("vendor_key") or infer_vendor_key_from_text(
-        ocr_text, farms_config
+        normalized_ocr, vendor_terms
     )
-    account_number = transaction_row.get("account_number") or extract_account_number(ocr_text)
-    invoice_number = transaction_row.get("invoice_number")
-    service_address = transaction_row.get("service_address") or extract_service_address_hint(ocr_text)
-
+    account_number = transaction_row.get("account_number") or extract_account_number(normalized_ocr)
     if not vendor_key or not account_number:
         return []
 
+    invoice_number = transaction_row.get("invoice_number")
+    service_address = transaction_row.get("service_address") or extract_service_address_hint(ocr_text)
+
     collision = check_account_collision(
         vendor_key=str(vendor_key),
         account_number=str(account_number),
         farms_config=farms_config,
         dynamic_rules_payload=dynamic_rules_payload,
-        transactions_rows=transactions_rows,
+        transaction_mappings=transaction_mappings,
+        farms_config_mappings=farms_config_mappings,
     )
 
     service_disambiguators = extract_service_disambiguators(service_address)
     keyword_disambiguators = extract_keyword_disambiguators(
         selected_farm_name=selected_farm_name,
         selected_farm_id=selected_farm_id,
-        ocr_text=ocr_text,
+        normalized_ocr=normalized_ocr,
     )
 
     if collision and not service_disambiguators and not keyword_disambiguators:
@@ -491,22 +526,28 @@ def propose_dynamic_rules(
     return proposals[:3]
 
 
-def load_cached_ocr_text(file_name: str) -> str:
-    cache_path = VISION_CACHE_DIR / f"{file_name}.txt"
-    if not cache_path.exists():
+def load_cached_ocr_text(file_path: str) -> str:
+    if not file_path:
         return ""
-    with cache_path.open("r", encoding="utf-8") as handle:
-        return handle.read()
-
-
-def extract_account_number(text: str) -> str | None:
-    patterns = [
-        r"account\s*(?:no|number|#)?\s*[:\-]?\s*([a-z0-9\-]{4,})",
-        r"acct\s*[:\-]?\s*([a-z0-9\-]{4,})",
-    ]
-    lower = normalize_text(text)
-    for pattern in patterns:
-        match = re.search(pattern, lower, flags=re.IGNORECASE)
+    cache_paths = [legacy_vision_cache_path(file_path)]
+    try:
+        cache_paths.insert(0, vision_cache_path(file_path))
+    except OSError as exc:
+        # The content-hash key needs the PDF itself; only the legacy
+        # file-name key can still be tried.
+        print(f"Warning: cannot read source PDF for OCR text: {exc}", file=sys.stderr)
+    for cache_path in cache_paths:
+        try:
+            return cache_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            continue
+    return ""
+
+
+def extract_account_number(normalized_text: str) -> str | None:
+    """Find an account number in text already passed through normalize_text."""
+    for pattern in _ACCOUNT_NUMBER_RES:
+        match = pattern.search(normalized_text)
         if match:
             return match.group(1).strip()
     return None
@@ -520,7 +561,7 @@ def extract_service_address_hint(text: str) -> str | None:
         if (
             "service for" in lowered
             or "po box" in lowered
-            or re.search(r"\b(?:rd|road|street|st|ave|blvd|ca)\b", lowered)
+            or _STREET_TOKEN_RE.search(lowered)
         ):
             candidates.append(line)
     if not candidates:
@@ -532,10 +573,9 @@ def extract_service_disambiguators(service_address: str | None) -> list[str]:
     if not service_address:
         return []
     normalized = normalize_text(service_address)
-    tokens = [segment.strip() for segment in re.split(r"[,;]", normalized) if segment.strip()]
     out: list[str] = []
-    for token in tokens:
-        cleaned = re.sub(r"\s+", " ", token).strip()
+    for segment in normalized.translate(_ADDRESS_SEPARATOR_TABLE).split(";"):
+        cleaned = " ".join(segment.split())
         if len(cleaned) < 4:
             continue
         if cleaned not in out:
@@ -546,23 +586,30 @@ def extract_service_disambiguators(service_address: str | None) -> list[str]:
 def extract_keyword_disambiguators(
     selected_farm_name: str,
     selected_farm_id: str,
-    ocr_text: str,
+    normalized_ocr: str,
 ) -> list[str]:
-    normalized_ocr = normalize_text(ocr_text)
-    farm_tokens = re.findall(r"[a-z0-9]{4,}", normalize_text(selected_farm_name))
-    farm_tokens.extend(re.findall(r"[a-z0-9]{4,}", normalize_text(selected_farm_id)))
-    keywords: list[str] = []
+    """Farm name/id tokens present in OCR text already passed through normalize_text."""
+    # Tokens cannot span the joining space, so one scan matches two.
+    farm_tokens = _KEYWORD_TOKEN_RE.findall(
+        normalize_text(f"{selected_farm_name} {selected_farm_id}")
+    )
+    keywords: dict[str, None] = {}
     for token in farm_tokens:
-        if token in {"farm", "farms", "expenses", "ranch"}:
+        if token in _KEYWORD_STOPWORDS:
             continue
-        if token in normalized_ocr and token not in keywords:
-            keywords.append(token)
-    return keywords[:3]
+        if token in normalized_ocr:
+            keywords[token] = None
+    return list(keywords)[:3]
 
 
-def infer_vendor_key_from_text(ocr_text: str, farms_config: dict[str, Any]) -> str | None:
-    lowered = normalize_text(ocr_text)
-    scores: dict[str, int] = {}
+def build_vendor_term_table(farms_config: dict[str, Any]) -> list[tuple[str, frozenset[str]]]:
+    """
+    Normalized match terms per (farm, vendor) entry, built once per session.
+
+    A vendor listed under several farms keeps one entry per farm, so its terms
+    count once per listing, as when the farms were walked per item.
+    """
+    table: list[tuple[str, frozenset[str]]] = []
     for farm in farms_config.get("farms") or []:
         vendors = farm.get("vendors") or {}
         for vendor_key, vendor_cfg in vendors.items():
@@ -571,10 +618,20 @@ def infer_vendor_key_from_text(ocr_text: str, farms_config: dict[str, Any]) -> s
                 terms.append(normalize_text(vendor_cfg.get("name")))
                 for kw in vendor_cfg.get("keywords") or []:
                     terms.append(normalize_text(str(kw)))
-            unique_terms = {t for t in terms if t and len(t) >= 3}
-            for term in unique_terms:
-                if term in lowered:
-                    scores[vendor_key] = scores.get(vendor_key, 0) + 1
+            table.append((vendor_key, frozenset(t for t in terms if t and len(t) >= 3)))
+    return table
+
+
+def infer_vendor_key_from_text(
+    normalized_ocr: str,
+    vendor_terms: list[tuple[str, frozenset[str]]],
+) -> str | None:
+    """Best-scoring vendor for OCR text already passed through normalize_text."""
+    scores: dict[str, int] = {}
+    for vendor_key, terms in vendor_terms:
+        hits = sum(1 for term in terms if term in normalized_ocr)
+        if hits:
+            scores[vendor_key] = scores.get(vendor_key, 0) + hits
     if not scores:
         return None
     ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
@@ -3,12 +3,15 @@
 from __future__ import annotations
 
 import re
+import threading
 from pathlib import Path
+from typing import Any, Callable
 
 from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
 from paths import BASE_DIR, DYNAMIC_RULES_PATH, INVOICES_DIR
 
@@ -18,6 +21,9 @@ from core.reinforcement import append_bill_to_contains_all_rule, extract_bill_to
 
 app = FastAPI(title="Farm Expense Command Center", docs_url=None, redoc_url=None)
 
+# Pipeline runs write the ledger and caches; only one may run at a time.
+_pipeline_lock = threading.Lock()
+
 templates_dir = BASE_DIR / "templates"
 templates = Jinja2Templates(directory=str(templates_dir))
 
@@ -220,6 +226,16 @@ async def upload_invoice(file: UploadFile = File(...)) -> RedirectResponse:
     return RedirectResponse("/invoices?uploaded=" + filename, status_code=303)
 
 
+def _run_pipeline_exclusive(func: Callable[..., Any], *args: Any) -> Any:
+    """Run one pipeline call, or raise 409 if another run is in progress."""
+    if not _pipeline_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A processing run is already in progress")
+    try:
+        return func(*args)
+    finally:
+        _pipeline_lock.release()
+
+
 @app.post("/invoices/process")
 async def process_one_invoice(filename: str = Form(...)) -> RedirectResponse:
     safe = _sanitize_pdf_filename(filename.strip())
@@ -229,7 +245,7 @@ async def process_one_invoice(filename: str = Form(...)) -> RedirectResponse:
     if not path.exists():
         raise HTTPException(status_code=404, detail="File not found in invoices folder")
     try:
-        result = run_one(path)
+        result = await run_in_threadpool(_run_pipeline_exclusive, run_one, path)
     except ValueError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
     status = result.get("status", "failed")
@@ -242,7 +258,7 @@ async def process_one_invoice(filename: str = Form(...)) -> RedirectResponse:
 @app.post("/invoices/process-all")
 async def process_all_invoices() -> RedirectResponse:
     try:
-        summary = run_all()
+        summary = await run_in_threadpool(_run_pipeline_exclusive, run_all)
     except ValueError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
     total = summary.get("total", 0)
@@ -2,11 +2,14 @@
 
 from __future__ import annotations
 
-import json
 import sqlite3
-from contextlib import closing
+import sys
+import threading
+from contextlib import closing, contextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+import orjson
 
 from paths import FARMS_CONFIG_PATH, LEDGER_DB_PATH
 
@@ -20,6 +23,35 @@ def get_connection() -> sqlite3.Connection:
     return connection
 
 
+_batch_state = threading.local()
+
+
+@contextmanager
+def batch_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Share one connection for every current_connection() call in this thread
+    until the block exits, instead of reconnecting per write.
+
+    The connection runs with synchronous=NORMAL: under WAL, commits then skip
+    their fsync and the log is synced at checkpoints. A power cut can drop the
+    last few commits of a batch (never corrupt the ledger); rerunning the
+    batch re-ingests them, since everything upstream is cached.
+    """
+    with closing(get_connection()) as connection:
+        connection.execute("PRAGMA synchronous = NORMAL")
+        _batch_state.connection = connection
+        try:
+            yield connection
+        finally:
+            _batch_state.connection = None
+
+
+def current_connection() -> sqlite3.Connection:
+    """Return this thread's batch connection, or a fresh one outside a batch."""
+    connection = getattr(_batch_state, "connection", None)
+    return connection if connection is not None else get_connection()
+
+
 def _table_has_column(connection: sqlite3.Connection, table: str, column: str) -> bool:
     """Check if a table has a column via PRAGMA table_info."""
     cursor = connection.execute(f"PRAGMA table_info({table})")
@@ -51,6 +83,98 @@ def _migrate_documents_raw_text(connection: sqlite3.Connection) -> None:
         connection.execute("ALTER TABLE documents ADD COLUMN raw_text TEXT")
 
 
+def _migrate_doc_id_indexes(connection: sqlite3.Connection) -> None:
+    """Index doc_id foreign keys so per-document lookups and deletes skip table scans."""
+    for name, table, column in (
+        ("idx_transactions_duplicate_of", "transactions", "duplicate_of_doc_id"),
+        ("idx_line_items_doc", "transaction_line_items", "doc_id"),
+        ("idx_review_decisions_doc", "manual_review_decisions", "doc_id"),
+        ("idx_tagging_events_doc", "tagging_events", "doc_id"),
+    ):
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({column})")
+
+
+_SCHEMA_PATH = Path(__file__).resolve().parent / "schema.sql"
+
+# Tables whose doc_id references cascade when a document row is deleted.
+_DOC_CHILD_TABLES = (
+    "transactions",
+    "transaction_line_items",
+    "manual_review_queue",
+    "manual_review_decisions",
+    "tagging_events",
+)
+
+
+def _migrate_cascade_foreign_keys(connection: sqlite3.Connection) -> None:
+    """
+    Rebuild document child tables whose doc_id foreign keys predate ON DELETE CASCADE.
+
+    SQLite cannot alter a constraint in place, so each stale table is recreated
+    from schema.sql, its rows copied by column name, and its indexes restored,
+    all in one transaction with foreign key enforcement paused (the documented
+    table-rebuild procedure). Rows are copied verbatim, so orphans left by older
+    versions carry over rather than failing startup; PRAGMA foreign_key_check
+    runs before the commit and reports them on stderr. Already-migrated tables
+    are left untouched.
+    """
+    stale_tables = [
+        table
+        for table in _DOC_CHILD_TABLES
+        if any(
+            row[3] == "doc_id" and row[6] != "CASCADE"
+            for row in connection.execute(f"PRAGMA foreign_key_list({table})")
+        )
+    ]
+    if not stale_tables:
+        return
+
+    statements = [s.strip() for s in _SCHEMA_PATH.read_text(encoding="utf-8").split(";")]
+    table_sql = {
+        table: next(s for s in statements if s.startswith(f"CREATE TABLE IF NOT EXISTS {table} ("))
+        for table in stale_tables
+    }
+    index_sql = [s for s in statements if s.startswith(("CREATE INDEX", "CREATE UNIQUE INDEX"))]
+
+    connection.commit()
+    connection.execute("PRAGMA foreign_keys = OFF")
+    try:
+        connection.execute("BEGIN")
+        for table in stale_tables:
+            new_table = f"{table}__rebuild"
+            connection.execute(
+                table_sql[table].replace(
+                    f"CREATE TABLE IF NOT EXISTS {table} (", f"CREATE TABLE {new_table} (", 1
+                )
+            )
+            old_columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            columns = ", ".join(
+                row[1]
+                for row in connection.execute(f"PRAGMA table_info({new_table})")
+                if row[1] in old_columns
+            )
+            connection.execute(f"INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table}")
+            connection.execute(f"DROP TABLE {table}")
+            connection.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for statement in index_sql:
+            connection.execute(statement)
+        orphan_counts: dict[str, int] = {}
+        for table in stale_tables:
+            for row in connection.execute(f"PRAGMA foreign_key_check({table})"):
+                orphan_counts[row[0]] = orphan_counts.get(row[0], 0) + 1
+        for table, count in orphan_counts.items():
+            print(
+                f"Ledger migration: {table} has {count} row(s) with dangling foreign keys",
+                file=sys.stderr,
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.execute("PRAGMA foreign_keys = ON")
+
+
 def init_db() -> None:
     """Initialize schema and seed stable reference data."""
     with closing(get_connection()) as connection:
@@ -60,12 +184,13 @@ def init_db() -> None:
         has_schema = cursor.fetchone() is not None
 
         if not has_schema:
-            schema_path = Path(__file__).resolve().parent / "schema.sql"
-            schema_sql = schema_path.read_text(encoding="utf-8")
+            schema_sql = _SCHEMA_PATH.read_text(encoding="utf-8")
             connection.executescript(schema_sql)
         else:
             _migrate_transactions_parse_columns(connection)
             _migrate_documents_raw_text(connection)
+            _migrate_doc_id_indexes(connection)
+            _migrate_cascade_foreign_keys(connection)
 
         _seed_farms(connection)
         connection.commit()
@@ -106,7 +231,7 @@ def _seed_farms(connection: sqlite3.Connection) -> None:
     if not farms_path.exists():
         return
 
-    farms_payload = json.loads(farms_path.read_text(encoding="utf-8"))
+    farms_payload = orjson.loads(farms_path.read_bytes())
     rows = _extract_farm_rows(farms_payload)
     for farm_key, display_name in rows:
         connection.execute(
@@ -2,25 +2,31 @@
 
 from __future__ import annotations
 
-import json
 from pathlib import Path
 from typing import Any
 
+import orjson
+
 
 class LedgerIOError(RuntimeError):
     """Raised when ledger read/write operations fail."""
 
 
 def read_json(path: str | Path, default: dict[str, Any] | None = None) -> dict[str, Any]:
-    """Read JSON object; return provided default if file does not exist."""
-    file_path = Path(path)
-    if not file_path.exists():
+    """
+    Read JSON object; return provided default if file does not exist.
+
+    Bytes are parsed with orjson without a separate exists() stat or a UTF-8
+    decode pass.
+    """
+    try:
+        raw = Path(path).read_bytes()
+    except FileNotFoundError:
         return dict(default or {})
 
     try:
-        with file_path.open("r", encoding="utf-8") as handle:
-            parsed = json.load(handle)
-    except json.JSONDecodeError as exc:
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError as exc:
         raise LedgerIOError(
             f"Failed to parse JSON in '{path}'. "
             "Original file unchanged; fix malformed JSON and retry."
@@ -35,22 +41,31 @@ def read_json(path: str | Path, default: dict[str, Any] | None = None) -> dict[s
 
 
 def atomic_rewrite_json(path: str | Path, data: dict[str, Any]) -> None:
-    """Atomically rewrite JSON file with validation."""
+    """
+    Atomically rewrite JSON file with validation.
+
+    Data is serialized in memory first, so unserializable payloads fail before
+    any file is touched; the bytes are written once to a temp file and renamed
+    over the original, with no read-back re-parse.
+    """
     file_path = Path(path)
     tmp_path = file_path.with_suffix(file_path.suffix + ".tmp")
-    if file_path.parent:
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-
     try:
-        with tmp_path.open("w", encoding="utf-8") as handle:
-            json.dump(data, handle, indent=2, ensure_ascii=False)
-            handle.write("\n")
-
-        with tmp_path.open("r", encoding="utf-8") as handle:
-            json.load(handle)
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    except orjson.JSONEncodeError as exc:
+        raise LedgerIOError(
+            f"Failed to serialize JSON for '{path}'. "
+            "Original file unchanged; fix issue and retry."
+        ) from exc
 
+    try:
+        try:
+            tmp_path.write_bytes(payload)
+        except FileNotFoundError:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(payload)
         tmp_path.replace(file_path)
-    except (OSError, json.JSONDecodeError) as exc:
+    except OSError as exc:
         _safe_remove(tmp_path)
         raise LedgerIOError(
             f"Failed to atomically rewrite JSON for '{path}'. "
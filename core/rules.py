@@ -3,9 +3,15 @@
 from __future__ import annotations
 
 import datetime
+import functools
 import hashlib
+import heapq
+import itertools
+import os
 import re
-from typing import Any
+import sys
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
 
 from core.db import execute
 from farm_tagger import TagCandidate, TagResult
@@ -16,20 +22,56 @@ DEFAULT_DYNAMIC_RULES = {"version": "1.0", "rules": []}
 BILL_TO_CONTAINS_ALL = "bill_to_contains_all"
 BILL_TO_MATCH = "bill_to_match"
 
+# Everything but letters and digits: separators, whitespace and underscores.
+_IDENTIFIER_STRIP_RE = re.compile(r"[\W_]+")
+# ASCII fast path for the same: lowercase letters, keep digits, drop the rest.
+_ASCII_IDENTIFIER_TABLE = {
+    code: (chr(code).lower() if chr(code).isalnum() else None) for code in range(128)
+}
 
+
+@dataclass(slots=True, frozen=True)
+class CompiledRule:
+    """A vendor rule with its match fields normalized for apply_dynamic_rules."""
+
+    rule: dict[str, Any]
+    vendor_key: str
+    account_number: str
+    service_needles: tuple[str, ...]
+    keywords_any: tuple[str, ...]
+
+
+@functools.lru_cache(maxsize=8192)
 def normalize_text(value: str | None) -> str:
-    """Lowercase and normalize whitespace."""
-    normalized = (value or "").lower()
-    normalized = re.sub(r"\s+", " ", normalized).strip()
-    return normalized
+    """
+    Lowercase and normalize whitespace.
+
+    str.split() breaks on the same characters as regex whitespace, so joining
+    its pieces collapses runs and trims both ends in one C-level pass. Results
+    are memoized: rule fields, vendor keys and account numbers recur across
+    rules and ledger rows.
+    """
+    return " ".join((value or "").lower().split())
 
 
+@functools.lru_cache(maxsize=8192)
 def normalize_identifier(value: str | None) -> str:
-    """Normalize identifiers for matching across punctuation variants."""
-    normalized = normalize_text(value)
-    normalized = re.sub(r"[-_/\s]", "", normalized)
-    normalized = re.sub(r"[^\w]", "", normalized)
-    return normalized
+    """
+    Normalize identifiers for matching across punctuation variants.
+
+    Results are interned, so raw variants of one key ("PG&E", "pge") share a
+    single string and the equality checks in the collision scans hit the
+    identity fast path.
+    """
+    return sys.intern(_strip_identifier(value))
+
+
+def _strip_identifier(value: str | None) -> str:
+    """Uncached, uninterned normalize_identifier for whole-document text."""
+    value = value or ""
+    if value.isascii():
+        return value.translate(_ASCII_IDENTIFIER_TABLE)
+    return _IDENTIFIER_STRIP_RE.sub("", value.lower())
 
 
 def generate_rule_id(rule_payload: dict[str, Any]) -> str:
@@ -48,6 +90,25 @@ def generate_rule_id(rule_payload: dict[str, Any]) -> str:
 
 def load_dynamic_rules(path: str) -> dict[str, Any]:
     """Load dynamic rules file; return default structure if file missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return dict(DEFAULT_DYNAMIC_RULES)
+    payload = _load_dynamic_rules_cached(
+        os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+    )
+    # Shallow copy: upsert_dynamic_rule replaces "rules" on the dict it is given.
+    return dict(payload)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_dynamic_rules_cached(path: str, mtime_ns: int, size: int) -> dict[str, Any]:
+    """
+    Parse the dynamic rules file once per (path, mtime, size).
+
+    A rewrite by upsert_dynamic_rule or ensure_dynamic_rules_file changes the
+    key, so the next load re-reads the file.
+    """
     payload = read_json(path, default=DEFAULT_DYNAMIC_RULES)
     version = payload.get("version") if isinstance(payload, dict) else None
     rules = payload.get("rules") if isinstance(payload, dict) else None
@@ -96,14 +157,19 @@ def append_manual_decision(path: str, decision: dict[str, Any]) -> None:
 def upsert_dynamic_rule(
     dynamic_rules_path: str,
     new_rule: dict[str, Any],
+    payload: dict[str, Any] | None = None,
 ) -> tuple[bool, str]:
     """
     Add a dynamic rule if absent.
 
+    Pass the caller's loaded rules payload to check against it and update it in
+    place instead of re-reading the file; the file is still rewritten on create.
     Returns `(created, rule_id)`.
     """
-    payload = ensure_dynamic_rules_file(dynamic_rules_path)
-    existing_rules = payload.get("rules") or []
+    if payload is None:
+        payload = ensure_dynamic_rules_file(dynamic_rules_path)
+    # Copied so a payload built from DEFAULT_DYNAMIC_RULES never shares its list.
+    existing_rules = list(payload.get("rules") or [])
     new_rule_id = generate_rule_id(new_rule)
     for existing in existing_rules:
         if existing.get("rule_id") == new_rule_id:
@@ -147,8 +213,10 @@ def apply_dynamic_rules(
     if not rules:
         return None
 
-    document_lower = normalize_text(vision_text)
-    document_identifier = normalize_identifier(vision_text)
+    # Whole documents are unique per call; keep them out of the memo caches
+    # and the intern table.
+    document_lower = normalize_text.__wrapped__(vision_text)
+    document_identifier = _strip_identifier(vision_text)
     farms_by_id = _build_farm_lookup(farms_config)
 
     bill_to_contains_all_rules = [
@@ -202,16 +270,38 @@ def apply_dynamic_rules(
                 reason=f"Bill-to match: {match_text}",
             )
 
-    vendor_rules = [
-        r for r in rules
-        if isinstance(r, dict)
-        and r.get("type") not in (BILL_TO_CONTAINS_ALL, BILL_TO_MATCH)
-        and normalize_identifier(r.get("vendor_key"))
-        and normalize_identifier(r.get("account_number"))
-    ]
+    vendor_rules = []
+    for rule in rules:
+        if not isinstance(rule, dict) or rule.get("type") in (BILL_TO_CONTAINS_ALL, BILL_TO_MATCH):
+            continue
+        compiled = _compile_rule(rule)
+        if compiled.vendor_key and compiled.account_number:
+            vendor_rules.append(compiled)
+    # Gate on account and vendor before ordering so only rules the document
+    # can satisfy get sorted. Each distinct account, vendor and needle is
+    # searched for once; rules then test set membership.
+    found_accounts = {
+        account_number
+        for account_number in {c.account_number for c in vendor_rules}
+        if account_number in document_identifier
+    }
+    vendor_rules = [c for c in vendor_rules if c.account_number in found_accounts]
+    vendor_present = {
+        vendor_key: _vendor_in_text(vendor_key, document_lower, document_identifier, farms_config)
+        for vendor_key in {c.vendor_key for c in vendor_rules}
+    }
+    vendor_rules = [c for c in vendor_rules if vendor_present[c.vendor_key]]
+    found_needles = {
+        needle
+        for needle in {
+            n for c in vendor_rules for n in (*c.service_needles, *c.keywords_any)
+        }
+        if needle in document_lower
+    }
     ordered = _order_vendor_rules(vendor_rules)
-    for rule in ordered:
-        if _matches_rule(rule, document_lower, document_identifier, farms_config):
+    for compiled in ordered:
+        if _matches_compiled(compiled, found_needles):
+            rule = compiled.rule
             farm_id = str(rule.get("farm_id") or "").strip()
             if not farm_id:
                 continue
@@ -236,8 +326,14 @@ def apply_dynamic_rules(
     return None
 
 
-def _order_vendor_rules(rules: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    """Order: service_address > keywords > vendor-only; then priority desc, rule_id asc."""
+def _order_vendor_rules(compiled_rules: list[CompiledRule]) -> Iterator[CompiledRule]:
+    """
+    Order: service_address > keywords > vendor-only; then priority desc, rule_id asc.
+
+    Yields lazily from a heap, so a caller stopping at the first match pays for
+    heapify plus one pop per rule tried rather than a full sort. The list index
+    breaks key ties, giving the same order as a stable sort.
+    """
     def tier(r: dict) -> int:
         has_svc = bool(r.get("service_address_contains"))
         has_kw = bool(r.get("keywords_any"))
@@ -247,10 +343,14 @@ def _order_vendor_rules(rules: list[dict[str, Any]]) -> list[dict[str, Any]]:
             return 1
         return 2
 
-    return sorted(
-        rules,
-        key=lambda r: (tier(r), -int(r.get("priority", 100)), str(r.get("rule_id", ""))),
-    )
+    def sort_key(compiled: CompiledRule) -> tuple[int, int, str]:
+        r = compiled.rule
+        return (tier(r), -int(r.get("priority", 100)), str(r.get("rule_id", "")))
+
+    heap = [(sort_key(c), index, c) for index, c in enumerate(compiled_rules)]
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[2]
 
 
 def check_account_collision(
@@ -258,27 +358,90 @@ def check_account_collision(
     account_number: str,
     farms_config: dict[str, Any],
     dynamic_rules_payload: dict[str, Any],
-    transactions_rows: list[dict[str, Any]],
+    transactions_rows: Iterable[dict[str, Any]] = (),
+    transaction_mappings: dict[tuple[str, str], set[str]] | None = None,
+    farms_config_mappings: dict[tuple[str, str], set[str]] | None = None,
 ) -> bool:
-    """Return True if vendor/account maps to multiple farms across sources."""
+    """
+    Return True if vendor/account maps to multiple farms across sources.
+
+    Callers checking many accounts against the same rows should pass
+    transaction_mappings from build_transaction_mappings instead of
+    transactions_rows, so the ledger is normalized once rather than per check.
+    Likewise farms_config_mappings from build_farms_config_mappings replaces
+    the per-check walk of farms_config.
+    """
     normalized_vendor = normalize_identifier(vendor_key)
     normalized_account = normalize_identifier(account_number)
     if not normalized_vendor or not normalized_account:
         return False
 
+    key = (normalized_vendor, normalized_account)
+    if farms_config_mappings is not None:
+        config_farm_ids = farms_config_mappings.get(key, ())
+    else:
+        config_farm_ids = _scan_farms_config_mappings(
+            normalized_vendor, normalized_account, farms_config
+        )
+    if transaction_mappings is not None:
+        transaction_farm_ids = transaction_mappings.get(key, ())
+    else:
+        transaction_farm_ids = _scan_transaction_mappings(
+            normalized_vendor, normalized_account, transactions_rows
+        )
+
+    # The scans are lazy, so stop at the second distinct farm.
     farm_ids: set[str] = set()
-    farm_ids.update(
-        _scan_farms_config_mappings(normalized_vendor, normalized_account, farms_config)
-    )
-    farm_ids.update(
-        _scan_dynamic_rule_mappings(
-            normalized_vendor, normalized_account, dynamic_rules_payload
+    for farm_id in itertools.chain(
+        config_farm_ids,
+        _scan_dynamic_rule_mappings(normalized_vendor, normalized_account, dynamic_rules_payload),
+        transaction_farm_ids,
+    ):
+        farm_ids.add(farm_id)
+        if len(farm_ids) > 1:
+            return True
+    return False
+
+
+def build_transaction_mappings(
+    transactions_rows: list[dict[str, Any]],
+) -> dict[tuple[str, str], set[str]]:
+    """Map (normalized vendor, normalized account) -> farm ids over non-duplicate rows."""
+    mappings: dict[tuple[str, str], set[str]] = {}
+    for row in transactions_rows:
+        if row.get("duplicate_detected"):
+            continue
+        farm_id = str(row.get("farm_id") or "").strip()
+        if not farm_id:
+            continue
+        key = (
+            normalize_identifier(row.get("vendor_key")),
+            normalize_identifier(row.get("account_number")),
         )
-    )
-    farm_ids.update(
-        _scan_transaction_mappings(normalized_vendor, normalized_account, transactions_rows)
-    )
-    return len(farm_ids) > 1
+        mappings.setdefault(key, set()).add(farm_id)
+    return mappings
+
+
+def build_farms_config_mappings(
+    farms_config: dict[str, Any],
+) -> dict[tuple[str, str], set[str]]:
+    """Map (normalized vendor, normalized identifier) -> farm ids from farms config."""
+    mappings: dict[tuple[str, str], set[str]] = {}
+    for farm in farms_config.get("farms") or []:
+        farm_id = str(farm.get("id") or farm.get("farm_id") or "").strip()
+        if not farm_id:
+            continue
+        vendors = farm.get("vendors") or {}
+        for vendor_cfg_key, vendor_cfg in vendors.items():
+            if not isinstance(vendor_cfg, dict):
+                continue
+            normalized_vendor = normalize_identifier(str(vendor_cfg_key))
+            for value in _vendor_config_identifiers(vendor_cfg):
+                if value is None:
+                    continue
+                key = (normalized_vendor, normalize_identifier(str(value)))
+                mappings.setdefault(key, set()).add(farm_id)
+    return mappings
 
 
 def _build_farm_lookup(farms_config: dict[str, Any]) -> dict[str, dict[str, Any]]:
@@ -291,27 +454,35 @@ def _build_farm_lookup(farms_config: dict[str, Any]) -> dict[str, dict[str, Any]
     return lookup
 
 
-def _matches_rule(
-    rule: dict[str, Any],
-    document_lower: str,
-    document_identifier: str,
-    farms_config: dict[str, Any],
+def _compile_rule(rule: dict[str, Any]) -> CompiledRule:
+    """Normalize a vendor rule's match fields once per apply_dynamic_rules call."""
+    return CompiledRule(
+        rule=rule,
+        vendor_key=normalize_identifier(rule.get("vendor_key")),
+        account_number=normalize_identifier(rule.get("account_number")),
+        service_needles=tuple(
+            normalize_text(x) for x in (rule.get("service_address_contains") or []) if x
+        ),
+        keywords_any=tuple(normalize_text(x) for x in (rule.get("keywords_any") or []) if x),
+    )
+
+
+def _matches_compiled(
+    compiled: CompiledRule,
+    found_needles: set[str],
 ) -> bool:
-    vendor_key = normalize_identifier(rule.get("vendor_key"))
-    account_number = normalize_identifier(rule.get("account_number"))
-    if not vendor_key or not account_number:
-        return False
-    if not _vendor_in_text(vendor_key, document_lower, document_identifier, farms_config):
-        return False
-    if account_number not in document_identifier:
-        return False
+    """
+    Match a compiled rule whose vendor and account already appear in the document.
 
-    service_needles = [normalize_text(x) for x in (rule.get("service_address_contains") or []) if x]
-    if service_needles and not all(n in document_lower for n in service_needles):
+    found_needles holds the service/keyword needles present in the normalized
+    document text.
+    """
+    service_needles = compiled.service_needles
+    if service_needles and not found_needles.issuperset(service_needles):
         return False
 
-    keywords_any = [normalize_text(x) for x in (rule.get("keywords_any") or []) if x]
-    if keywords_any and not any(k in document_lower for k in keywords_any):
+    keywords_any = compiled.keywords_any
+    if keywords_any and found_needles.isdisjoint(keywords_any):
         return False
 
     return True
@@ -346,38 +517,42 @@ def _scan_farms_config_mappings(
     normalized_vendor: str,
     normalized_account: str,
     farms_config: dict[str, Any],
-) -> set[str]:
-    farm_ids: set[str] = set()
+) -> Iterator[str]:
     for farm in farms_config.get("farms") or []:
         farm_id = str(farm.get("id") or farm.get("farm_id") or "").strip()
+        if not farm_id:
+            continue
         vendors = farm.get("vendors") or {}
         for vendor_cfg_key, vendor_cfg in vendors.items():
             if normalize_identifier(str(vendor_cfg_key)) != normalized_vendor:
                 continue
             if not isinstance(vendor_cfg, dict):
                 continue
-            values = list(vendor_cfg.get("identifiers") or [])
-            for field in (
-                "account_numbers",
-                "meter_numbers",
-                "policy_numbers",
-                "loan_numbers",
-                "order_numbers",
-                "customer_numbers",
-            ):
-                values.extend(vendor_cfg.get(field) or [])
-            normalized_values = {normalize_identifier(str(v)) for v in values if v is not None}
-            if normalized_account in normalized_values and farm_id:
-                farm_ids.add(farm_id)
-    return farm_ids
+            for value in _vendor_config_identifiers(vendor_cfg):
+                if value is not None and normalize_identifier(str(value)) == normalized_account:
+                    yield farm_id
+                    break
+
+
+def _vendor_config_identifiers(vendor_cfg: dict[str, Any]) -> list[Any]:
+    values = list(vendor_cfg.get("identifiers") or [])
+    for field in (
+        "account_numbers",
+        "meter_numbers",
+        "policy_numbers",
+        "loan_numbers",
+        "order_numbers",
+        "customer_numbers",
+    ):
+        values.extend(vendor_cfg.get(field) or [])
+    return values
 
 
 def _scan_dynamic_rule_mappings(
     normalized_vendor: str,
     normalized_account: str,
     dynamic_rules_payload: dict[str, Any],
-) -> set[str]:
-    farm_ids: set[str] = set()
+) -> Iterator[str]:
     for rule in dynamic_rules_payload.get("rules") or []:
         if normalize_identifier(rule.get("vendor_key")) != normalized_vendor:
             continue
@@ -385,16 +560,14 @@ def _scan_dynamic_rule_mappings(
             continue
         farm_id = str(rule.get("farm_id") or "").strip()
         if farm_id:
-            farm_ids.add(farm_id)
-    return farm_ids
+            yield farm_id
 
 
 def _scan_transaction_mappings(
     normalized_vendor: str,
     normalized_account: str,
-    transactions_rows: list[dict[str, Any]],
-) -> set[str]:
-    farm_ids: set[str] = set()
+    transactions_rows: Iterable[dict[str, Any]],
+) -> Iterator[str]:
     for row in transactions_rows:
         if row.get("duplicate_detected"):
             continue
@@ -404,5 +577,4 @@ def _scan_transaction_mappings(
             continue
         farm_id = str(row.get("farm_id") or "").strip()
         if farm_id:
-            farm_ids.add(farm_id)
-    return farm_ids
+            yield farm_id
@@ -53,10 +53,10 @@ CREATE TABLE IF NOT EXISTS transactions (
     parse_failure_reason TEXT,
     created_at TEXT NOT NULL DEFAULT (datetime('now')),
     updated_at TEXT NOT NULL DEFAULT (datetime('now')),
-    FOREIGN KEY (doc_id) REFERENCES documents(doc_id),
+    FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE,
     FOREIGN KEY (farm_key) REFERENCES farms(farm_key),
     FOREIGN KEY (vendor_key) REFERENCES vendors(vendor_key),
-    FOREIGN KEY (duplicate_of_doc_id) REFERENCES documents(doc_id)
+    FOREIGN KEY (duplicate_of_doc_id) REFERENCES documents(doc_id) ON DELETE SET NULL
 );
 
 CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_invoice_key_original
@@ -82,7 +82,7 @@ CREATE TABLE IF NOT EXISTS transaction_line_items (
     description TEXT,
     amount_cents INTEGER NOT NULL DEFAULT 0,
     created_at TEXT NOT NULL DEFAULT (datetime('now')),
-    FOREIGN KEY (doc_id) REFERENCES documents(doc_id)
+    FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS manual_review_queue (
@@ -95,7 +95,7 @@ CREATE TABLE IF NOT EXISTS manual_review_queue (
     status TEXT NOT NULL DEFAULT 'open' CHECK (status IN ('open', 'resolved')),
     queued_at TEXT NOT NULL DEFAULT (datetime('now')),
     resolved_at TEXT,
-    FOREIGN KEY (doc_id) REFERENCES documents(doc_id)
+    FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS manual_review_decisions (
@@ -108,7 +108,7 @@ CREATE TABLE IF NOT EXISTS manual_review_decisions (
     decision_source TEXT NOT NULL,
     notes TEXT,
     created_at TEXT NOT NULL DEFAULT (datetime('now')),
-    FOREIGN KEY (doc_id) REFERENCES documents(doc_id),
+    FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE,
     FOREIGN KEY (selected_farm_key) REFERENCES farms(farm_key)
 );
 
@@ -123,5 +123,17 @@ CREATE TABLE IF NOT EXISTS tagging_events (
     reason TEXT,
     features_json TEXT,
     tagged_at TEXT NOT NULL DEFAULT (datetime('now')),
-    FOREIGN KEY (doc_id) REFERENCES documents(doc_id)
+    FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
 );
+
+CREATE INDEX IF NOT EXISTS idx_transactions_duplicate_of
+ON transactions(duplicate_of_doc_id);
+
+CREATE INDEX IF NOT EXISTS idx_line_items_doc
+ON transaction_line_items(doc_id);
+
+CREATE INDEX IF NOT EXISTS idx_review_decisions_doc
+ON manual_review_decisions(doc_id);
+
+CREATE INDEX IF NOT EXISTS idx_tagging_events_doc
+ON tagging_events(doc_id);
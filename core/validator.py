@@ -29,6 +29,23 @@ _DATE_FORMATS = (
 )
 
 
+def numeric_date_format(raw: str) -> str | None:
+    """
+    Pick the single candidate numeric date format from separator positions.
+
+    Returns "%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y", or None when the shape matches
+    none of them, so callers run at most one strptime instead of trying each.
+    """
+    if raw[4:5] == "-" and raw[:4].isdigit():
+        return "%Y-%m-%d"
+    head = raw[:3]
+    if "/" in head:
+        return "%m/%d/%Y"
+    if "-" in head:
+        return "%m-%d-%Y"
+    return None
+
+
 def normalize_total_to_cents(raw_total: str | int | float) -> int:
     """
     Convert raw total to integer cents. Deterministic, pure.
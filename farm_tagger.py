@@ -3,10 +3,12 @@ Farm Identity Resolution Engine — deterministic, rule-based farm matching.
 No LLM calls. Used to route documents to auto-process vs manual review.
 """
 
-import json
+import functools
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
 
 
 @dataclass
@@ -49,11 +51,24 @@ def load_farms(config_path: str = "config/farms.json") -> Dict[str, Any]:
         json.JSONDecodeError: If config is invalid JSON.
     """
     path = Path(config_path)
-    if not path.exists():
-        raise FileNotFoundError(f"Farms config not found: {config_path}")
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Farms config not found: {config_path}") from None
+    return _load_farms_cached(str(path.resolve()), mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_farms_cached(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """
+    Parse and normalize farms.json once per (path, mtime).
 
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    Returning the same object while the file is unchanged also lets the
+    per-config term index in tag_document_text stay warm across calls.
+    Callers must treat the result as read-only.
+    """
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
 
     if isinstance(data, dict) and "farms" in data and isinstance(data["farms"], list):
         return data
@@ -114,45 +129,54 @@ def _normalize_flat_farms_to_spec(flat: Dict[str, Any]) -> List[Dict[str, Any]]:
     return out
 
 
-def _score_farm(document_lower: str, farm: Dict[str, Any]) -> tuple[float, List[str]]:
-    """
-    Score one farm against document text. Case-insensitive.
-    Returns (score, list of matched rule names).
-    """
-    score = 0.0
-    matched_rules: List[str] = []
+# One match term: (lowercased text, score weight, matched rule name).
+_Term = Tuple[str, float, str]
 
-    farm_identifiers = [str(x).strip().lower() for x in (farm.get("identifiers") or []) if x]
-    for ident in farm_identifiers:
-        if not ident:
-            continue
-        if ident in document_lower:
-            score += 1.0
-            matched_rules.append("identifier_match")
+# (farms_config, [(farm_id, farm_name, terms)]) for the most recently indexed
+# config; compared by identity.
+_farm_terms_cache: Optional[Tuple[Dict[str, Any], List[Tuple[str, str, List[_Term]]]]] = None
+
+
+def _lowered_terms(values: Any) -> List[str]:
+    return [t for t in (str(x).strip().lower() for x in (values or []) if x) if t]
 
-    farm_keywords = [str(x).strip().lower() for x in (farm.get("keywords") or []) if x]
-    for kw in farm_keywords:
-        if not kw:
-            continue
-        if kw in document_lower:
-            score += 0.15
-            matched_rules.append("farm_keyword")
 
-    vendors = farm.get("vendors") or {}
-    for vendor_key, vconf in vendors.items():
+def _farm_match_terms(farm: Dict[str, Any]) -> List[_Term]:
+    """Lowercased match terms for one farm, in scoring order."""
+    terms: List[_Term] = [(t, 1.0, "identifier_match") for t in _lowered_terms(farm.get("identifiers"))]
+    terms += [(t, 0.15, "farm_keyword") for t in _lowered_terms(farm.get("keywords"))]
+    for vconf in (farm.get("vendors") or {}).values():
         if not isinstance(vconf, dict):
             continue
-        v_identifiers = [str(x).strip().lower() for x in (vconf.get("identifiers") or []) if x]
-        v_keywords = [str(x).strip().lower() for x in (vconf.get("keywords") or []) if x]
-        for vi in v_identifiers:
-            if vi and vi in document_lower:
-                score += 1.0
-                matched_rules.append("vendor_identifier_match")
-        for vk in v_keywords:
-            if vk and vk in document_lower:
-                score += 0.25
-                matched_rules.append("vendor_keyword")
+        terms += [(t, 1.0, "vendor_identifier_match") for t in _lowered_terms(vconf.get("identifiers"))]
+        terms += [(t, 0.25, "vendor_keyword") for t in _lowered_terms(vconf.get("keywords"))]
+    return terms
+
+
+def _farm_terms(farms_config: Dict[str, Any]) -> List[Tuple[str, str, List[_Term]]]:
+    """Return (farm_id, farm_name, terms) per farm, built once per config object."""
+    global _farm_terms_cache
+    if _farm_terms_cache is not None and _farm_terms_cache[0] is farms_config:
+        return _farm_terms_cache[1]
+    indexed = []
+    for farm in farms_config.get("farms") or []:
+        farm_id = farm.get("id") or farm.get("farm_id") or ""
+        indexed.append((farm_id, farm.get("name") or farm_id, _farm_match_terms(farm)))
+    _farm_terms_cache = (farms_config, indexed)
+    return indexed
+
 
+def _score_farm(document_lower: str, terms: List[_Term]) -> tuple[float, List[str]]:
+    """
+    Score one farm's precomputed terms against lowercased document text.
+    Returns (score, list of matched rule names).
+    """
+    score = 0.0
+    matched_rules: List[str] = []
+    for term, weight, rule in terms:
+        if term in document_lower:
+            score += weight
+            matched_rules.append(rule)
     return (score, matched_rules)
 
 
@@ -193,11 +217,11 @@ def tag_document_text(document_text: str, farms_config: Dict[str, Any]) -> TagRe
 
     document_lower = (document_text or "").lower()
 
+    farms_by_id: Dict[str, Dict[str, Any]] = {}
     candidates: List[TagCandidate] = []
-    for farm in farms:
-        farm_id = farm.get("id") or farm.get("farm_id") or ""
-        farm_name = farm.get("name") or farm_id
-        score, matched_rules = _score_farm(document_lower, farm)
+    for farm, (farm_id, farm_name, terms) in zip(farms, _farm_terms(farms_config)):
+        farms_by_id.setdefault(farm_id, farm)
+        score, matched_rules = _score_farm(document_lower, terms)
         if score > 0:
             candidates.append(TagCandidate(
                 farm_id=farm_id,
@@ -249,8 +273,8 @@ def tag_document_text(document_text: str, farms_config: Dict[str, Any]) -> TagRe
     if candidates and len(candidates) >= 2:
         top_farm_id = candidates[0].farm_id
         second_farm_id = candidates[1].farm_id
-        top_farm = next((f for f in farms if (f.get("id") or f.get("farm_id")) == top_farm_id), None)
-        second_farm = next((f for f in farms if (f.get("id") or f.get("farm_id")) == second_farm_id), None)
+        top_farm = farms_by_id.get(top_farm_id)
+        second_farm = farms_by_id.get(second_farm_id)
         if top_farm and second_farm:
             top_vendors = set((top_farm.get("vendors") or {}).keys())
             second_vendors = set((second_farm.get("vendors") or {}).keys())
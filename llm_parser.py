@@ -3,21 +3,35 @@ LLM extraction helpers for OCR and structured invoice parsing.
 """
 
 import base64
+import copy
+import functools
+import hashlib
 import json
+import os
+import threading
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
 import fitz  # PyMuPDF
-from openai import OpenAI
+import httpx
+import orjson
+from openai import DefaultHttpxClient, OpenAI
 
 from core.ocr_utils import sanitize_vision_output
-from paths import VISION_CACHE_DIR
+from paths import STRUCTURED_CACHE_DIR, VISION_CACHE_DIR
 
 
 class LLMParseError(Exception):
     """Raised when LLM parsing fails."""
 
 
+_JSON_OBJECT_DECODER = json.JSONDecoder()
+_PREVIEW_TABLE = str.maketrans({"\r": "\\r", "\n": "\\n"})
+
+
+# System prompts are sent byte-for-byte identical on every call and all
+# per-invoice content goes last, so requests share a stable prefix that
+# OpenAI's automatic prompt caching can reuse. Never interpolate into them.
 VISION_OCR_SYSTEM_PROMPT = """You are a high-precision OCR engine.
 
 Extract all visible text from the provided document exactly as it appears.
@@ -70,6 +84,48 @@ Field rules:
 - Return raw JSON only. No markdown, no comments, no extra keys.
 """
 
+# Rendered pages are sent as JPEG: for invoice scans at 2x it is visually
+# equivalent to PNG for OCR and several times smaller on the wire.
+VISION_JPEG_QUALITY = 85
+_VISION_RENDER_MATRIX = fitz.Matrix(2, 2)
+
+# PyMuPDF is not thread-safe; every fitz call from this module runs under this
+# lock so callers may fan out per-PDF work across threads.
+_PDF_LOCK = threading.Lock()
+
+# Born-digital PDFs whose text layer has at least this many characters (and
+# some digits) are read directly instead of being sent to vision OCR.
+EMBEDDED_TEXT_MIN_CHARS = 200
+
+# Bump when VISION_OCR_SYSTEM_PROMPT (or rendering) changes enough that cached
+# vision text produced under the old settings should no longer be reused.
+VISION_PROMPT_VERSION = "vocr-v1"
+
+# Models are part of both cache keys, so switching either one re-runs that
+# stage instead of serving text or fields produced by the previous model.
+VISION_MODEL = "gpt-4o"
+STRUCTURED_MODEL = "gpt-4o"
+
+# Bump when STRUCTURED_PARSE_SYSTEM_PROMPT semantics change; part of the
+# structured cache key alongside the prompt text itself.
+STRUCTURED_PROMPT_VERSION = "sp-v1"
+
+# Structured fields in output order; every key other than total_amount is text.
+_STRUCTURED_FIELDS = (
+    "vendor_name",
+    "invoice_number",
+    "invoice_date",
+    "due_date",
+    "total_amount",
+    "service_address",
+    "account_number",
+)
+
+# Batch API custom_id prefixes; the suffix is the cache key the result is stored under.
+_VISION_BATCH_PREFIX = "vision:"
+_STRUCTURED_BATCH_PREFIX = "structured:"
+_BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
 JSON_REPAIR_USER_INSTRUCTION = (
     "Your previous response was not valid JSON. "
     "Return ONLY one valid JSON object matching the required schema. "
@@ -77,95 +133,259 @@ JSON_REPAIR_USER_INSTRUCTION = (
 )
 
 
-def _render_pdf_pages_for_vision_text(pdf_path: str, max_pages: int = 3) -> List[str]:
-    """Render PDF pages at 2x resolution for vision text extraction."""
-    doc = fitz.open(pdf_path)
-    images_base64 = []
-    matrix = fitz.Matrix(2, 2)
-    for page_num in range(min(max_pages, len(doc))):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap(matrix=matrix)
-        img_bytes = pix.tobytes("png")
-        img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-        images_base64.append(img_b64)
-    doc.close()
-    return images_base64
+# Pool limits for OpenAI clients. httpx drops idle connections after 5s by
+# default, shorter than the gap between one invoice's calls and the next in a
+# batch, which forced a fresh TLS handshake per request; keep them for 60s.
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_client(api_key: str) -> OpenAI:
+    """Return a shared OpenAI client per API key so its connection pool is reused."""
+    return OpenAI(api_key=api_key, http_client=DefaultHttpxClient(limits=_HTTP_LIMITS))
+
+
+def _render_pdf_pages_for_vision_text(pdf_path: str, max_pages: int = 3) -> Iterator[Dict[str, Any]]:
+    """
+    Render PDF pages at 2x resolution and yield one image_url message part per page.
+
+    Each page's base64 JPEG is built once, directly into its message part.
+    Pages render serially on the calling thread: PyMuPDF does not support
+    multithreaded use, even with one Document per thread. Parallelism belongs
+    at the per-PDF level.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(min(max_pages, len(doc))):
+            page = doc.load_page(page_num)
+            pix = page.get_pixmap(matrix=_VISION_RENDER_MATRIX)
+            img_bytes = pix.tobytes("jpg", jpg_quality=VISION_JPEG_QUALITY)
+            # Release the raw pixmap before suspending at yield; only the
+            # encoded page is needed from here on.
+            pix = None
+            page = None
+            img_b64 = base64.b64encode(img_bytes).decode("ascii")
+            yield {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"},
+            }
+
+
+def _embedded_pdf_text(pdf_path: str, max_pages: int) -> str | None:
+    """
+    Return the PDF's own text layer when it is usable in place of vision OCR.
+
+    Scanned or image-only PDFs have an empty or near-empty text layer and
+    return None, as do layers without any digits (no amounts to extract).
+    Callers check the vision cache first; an existing entry always wins.
+    """
+    with _PDF_LOCK, fitz.open(pdf_path) as doc:
+        text = "\n".join(
+            doc.load_page(page_num).get_text("text")
+            for page_num in range(min(max_pages, len(doc)))
+        ).strip()
+    if len(text) < EMBEDDED_TEXT_MIN_CHARS or not any(ch.isdigit() for ch in text):
+        return None
+    return text
+
+
+def vision_cache_path(pdf_path: str | Path) -> Path:
+    """Return the vision text cache path for a PDF, keyed by its content hash."""
+    with open(pdf_path, "rb") as handle:
+        digest = hashlib.file_digest(handle, "sha256").hexdigest()
+    return VISION_CACHE_DIR / f"{VISION_PROMPT_VERSION}-{VISION_MODEL}-{digest}.txt"
+
+
+def legacy_vision_cache_path(pdf_path: str | Path) -> Path:
+    """Return the pre-content-hash vision cache path, keyed by PDF file name."""
+    return VISION_CACHE_DIR / f"{Path(pdf_path).name}.txt"
 
 
 def extract_invoice_text_with_vision(
     pdf_path: str,
     api_key: str,
     max_pages: int = 3,
+    quiet: bool = False,
 ) -> str:
     """
     Extract plain text from PDF using GPT-4o vision with caching.
 
-    Caching: keyed by filename; checks canonical vision text cache by filename
-    before any API call. Never caches empty strings.
+    Caching: keyed by SHA-256 of the PDF bytes plus VISION_PROMPT_VERSION and
+    VISION_MODEL, so renamed copies reuse the cache and same-named different
+    files do not collide. Checked before any API call. Never caches empty
+    strings. Entries written under the old file-name key are still read and
+    copied to the content-hash key.
+
+    Born-digital PDFs with a usable text layer skip rendering and the vision
+    call entirely; that text is cached under the same key. The text layer is
+    only consulted after both cache keys miss, so PDFs OCR'd by vision before
+    keep their cached text and content fingerprints.
     """
-    VISION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    doc_id = Path(pdf_path).name
-    cache_path = VISION_CACHE_DIR / f"{doc_id}.txt"
-
-    if cache_path.exists():
-        with cache_path.open("r", encoding="utf-8") as f:
-            cached_text = f.read()
-        if cached_text.strip():
-            print("  -> Using cached vision text")
-            return sanitize_vision_output(cached_text)
+    cache_path = vision_cache_path(pdf_path)
 
-    print("  -> Extracting with GPT-4o vision")
-    client = OpenAI(api_key=api_key)
-    images_base64 = _render_pdf_pages_for_vision_text(pdf_path, max_pages=max_pages)
-    if not images_base64:
+    cached_text = _lookup_vision_cache(pdf_path, cache_path)
+    if cached_text is not None:
+        if not quiet:
+            print("  -> Using cached vision text")
+        return cached_text
+
+    embedded_text = _embedded_pdf_text(pdf_path, max_pages)
+    if embedded_text is not None:
+        if not quiet:
+            print("  -> Using embedded PDF text")
+        return _store_vision_text(cache_path, embedded_text)
+
+    if not quiet:
+        print("  -> Extracting with GPT-4o vision")
+    client = _get_client(api_key)
+    request_kwargs = _vision_request_kwargs(pdf_path, max_pages)
+    if request_kwargs is None:
         return ""
 
-    content: List[Dict[str, Any]] = [{"type": "text", "text": "Extract all visible text from these invoice images as plain text."}]
-    for img_b64 in images_base64:
-        content.append({
-            "type": "image_url",
-            "image_url": {"url": f"data:image/png;base64,{img_b64}"},
-        })
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
+    response = client.chat.completions.create(**request_kwargs)
+    return _store_vision_text(cache_path, response.choices[0].message.content)
+
+
+def cached_vision_text(pdf_path: str | Path) -> str | None:
+    """Return cached vision text for a PDF without rendering or calling the API."""
+    return _lookup_vision_cache(pdf_path, vision_cache_path(pdf_path))
+
+
+def _lookup_vision_cache(pdf_path: str | Path, cache_path: Path) -> str | None:
+    """
+    Return cached vision text from the content-hash key or the legacy file-name key.
+
+    A legacy hit is copied to cache_path so later lookups stay on the new key.
+    """
+    cached_text = _read_vision_cache(cache_path)
+    if cached_text is not None:
+        return cached_text
+    try:
+        legacy_bytes = legacy_vision_cache_path(pdf_path).read_bytes()
+    except FileNotFoundError:
+        return None
+    if not legacy_bytes.strip():
+        return None
+    _atomic_write_bytes(cache_path, legacy_bytes)
+    return sanitize_vision_output(legacy_bytes.decode("utf-8"))
+
+
+def _read_vision_cache(cache_path: Path) -> str | None:
+    """Return sanitized cached vision text, or None on a miss or empty entry."""
+    try:
+        cached_text = cache_path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    if not cached_text.strip():
+        return None
+    return sanitize_vision_output(cached_text)
+
+
+def _vision_request_kwargs(pdf_path: str, max_pages: int) -> Dict[str, Any] | None:
+    """Render pages into vision chat completion arguments; None when the PDF has no pages."""
+    with _PDF_LOCK:
+        image_parts = list(_render_pdf_pages_for_vision_text(pdf_path, max_pages=max_pages))
+    if not image_parts:
+        return None
+    content: List[Dict[str, Any]] = [
+        {"type": "text", "text": "Extract all visible text from these invoice images as plain text."},
+        *image_parts,
+    ]
+    return {
+        "model": VISION_MODEL,
+        "temperature": 0,
+        "messages": [
             {"role": "system", "content": VISION_OCR_SYSTEM_PROMPT},
             {"role": "user", "content": content},
         ],
-    )
-    raw_text = (response.choices[0].message.content or "").strip()
-    vision_text = sanitize_vision_output(raw_text)
+    }
+
+
+def _store_vision_text(cache_path: Path, raw_text: str | None) -> str:
+    """Sanitize raw vision output and cache it when non-empty."""
+    vision_text = sanitize_vision_output((raw_text or "").strip())
     if vision_text:
-        with cache_path.open("w", encoding="utf-8") as f:
-            f.write(vision_text)
+        _atomic_write_bytes(cache_path, vision_text.encode("utf-8"))
     return vision_text
 
 
 def parse_invoice_with_llm(ocr_text: str, api_key: str) -> Dict[str, Any]:
     """
     Use GPT-4o text parsing to extract structured invoice summary fields from OCR text.
+
+    Caching: results are keyed by SHA-256 of the prompt version, system prompt and
+    OCR text; hits come from an in-process LRU first, then the on-disk structured
+    cache. Failures are never cached.
     """
     if not (ocr_text or "").strip():
         raise LLMParseError("OCR text is empty; cannot parse structured invoice fields.")
-    client = OpenAI(api_key=api_key)
-    user_prompt = (
-        "Extract structured invoice summary data from this OCR text.\n\n"
-        f"OCR_TEXT:\n{ocr_text}"
-    )
+    # Deep copy: nested line_items are shared with the LRU entry.
+    return copy.deepcopy(_parse_invoice_with_llm_cached(ocr_text, api_key))
+
+
+def structured_cache_path(ocr_text: str) -> Path:
+    """Return the structured parse cache path for OCR text."""
+    key_source = f"{STRUCTURED_PROMPT_VERSION}\n{STRUCTURED_MODEL}\n{STRUCTURED_PARSE_SYSTEM_PROMPT}\n{ocr_text}"
+    digest = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+    return STRUCTURED_CACHE_DIR / f"{digest}.json"
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_invoice_with_llm_cached(ocr_text: str, api_key: str) -> Dict[str, Any]:
+    """Structured parse with disk cache; wrapped in an LRU for in-process reuse."""
+    cache_path = structured_cache_path(ocr_text)
+    cached = _read_structured_cache(cache_path)
+    if cached is not None:
+        return cached
+
+    normalized = _request_and_normalize_structured_invoice(ocr_text, api_key)
+    _write_structured_cache(cache_path, normalized)
+    return normalized
+
+
+def _read_structured_cache(cache_path: Path) -> Dict[str, Any] | None:
+    """Return the normalized cached parse, or None on a miss or unreadable entry."""
+    try:
+        cached = orjson.loads(cache_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if not isinstance(cached, dict):
+        return None
+    return _normalize_structured_invoice(cached)
+
+
+def _write_structured_cache(cache_path: Path, normalized: Dict[str, Any]) -> None:
+    """Best-effort persist of a normalized parse."""
+    try:
+        _atomic_write_bytes(cache_path, orjson.dumps(normalized))
+    except OSError:
+        pass
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """
+    Write via temp file + rename so a killed process never leaves a partial cache entry.
+
+    The cache directory is created only when the first write finds it missing
+    (ensure_data_dirs normally has), not stat'ed on every call.
+    """
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    try:
+        tmp_path.write_bytes(data)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
 
+def _request_and_normalize_structured_invoice(ocr_text: str, api_key: str) -> Dict[str, Any]:
+    """Run the structured parse request (with one JSON repair retry) and normalize."""
+    client = _get_client(api_key)
     try:
-        raw_output = _request_structured_parse(client, user_prompt)
+        raw_output = _request_structured_parse(client, _structured_user_prompt(ocr_text))
         try:
             parsed = _safe_parse_json(raw_output)
         except LLMParseError:
-            repair_prompt = (
-                f"{JSON_REPAIR_USER_INSTRUCTION}\n\n"
-                f"OCR_TEXT:\n{ocr_text}\n\n"
-                f"PREVIOUS_RESPONSE_PREVIEW:\n{_preview_text(raw_output, limit=300)}"
-            )
-            retry_output = _request_structured_parse(client, repair_prompt)
+            retry_output = _request_structured_parse(client, _structured_repair_prompt(ocr_text, raw_output))
             parsed = _safe_parse_json(retry_output)
         return _normalize_structured_invoice(parsed)
 
@@ -173,19 +393,166 @@ def parse_invoice_with_llm(ocr_text: str, api_key: str) -> Dict[str, Any]:
         raise LLMParseError(str(e))
 
 
-def _request_structured_parse(client: OpenAI, user_prompt: str) -> str:
-    """Execute one structured parsing request and return raw model output."""
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
+def _structured_user_prompt(ocr_text: str) -> str:
+    return (
+        "Extract structured invoice summary data from this OCR text.\n\n"
+        f"OCR_TEXT:\n{ocr_text}"
+    )
+
+
+def _structured_repair_prompt(ocr_text: str, raw_output: str) -> str:
+    # Starts with the exact first-attempt prompt so the retry shares its token
+    # prefix (system prompt + OCR text) and can hit OpenAI's prompt cache.
+    return (
+        f"{_structured_user_prompt(ocr_text)}\n\n"
+        f"PREVIOUS_RESPONSE_PREVIEW:\n{_preview_text(raw_output, limit=300)}\n\n"
+        f"{JSON_REPAIR_USER_INSTRUCTION}"
+    )
+
+
+def _structured_request_kwargs(user_prompt: str) -> Dict[str, Any]:
+    """
+    Chat completion arguments for one structured parsing request.
+
+    JSON mode constrains the model to a single JSON object, so the repair retry
+    is a guardrail that should rarely fire.
+    """
+    return {
+        "model": STRUCTURED_MODEL,
+        "temperature": 0,
+        "response_format": {"type": "json_object"},
+        "messages": [
             {"role": "system", "content": STRUCTURED_PARSE_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt},
         ],
-    )
+    }
+
+
+def _request_structured_parse(client: OpenAI, user_prompt: str) -> str:
+    """Execute one structured parsing request and return raw model output."""
+    response = client.chat.completions.create(**_structured_request_kwargs(user_prompt))
     return (response.choices[0].message.content or "").strip()
 
 
+def submit_vision_batch(pdf_paths: List[str], api_key: str, max_pages: int = 3) -> str | None:
+    """
+    Submit vision OCR for uncached PDFs as one OpenAI Batch API job.
+
+    Batch requests cost half the synchronous price and bypass the interactive
+    rate limit, at the cost of up to 24h latency; use for backfills. Returns
+    the batch id, or None when every PDF is already cached.
+    """
+    lines: List[bytes] = []
+    seen: set[str] = set()
+    for pdf_path in pdf_paths:
+        cache_path = vision_cache_path(pdf_path)
+        if cache_path.stem in seen or _lookup_vision_cache(pdf_path, cache_path) is not None:
+            continue
+        embedded_text = _embedded_pdf_text(str(pdf_path), max_pages)
+        if embedded_text is not None:
+            _store_vision_text(cache_path, embedded_text)
+            continue
+        request_kwargs = _vision_request_kwargs(str(pdf_path), max_pages)
+        if request_kwargs is None:
+            continue
+        seen.add(cache_path.stem)
+        lines.append(_batch_request_line(f"{_VISION_BATCH_PREFIX}{cache_path.stem}", request_kwargs))
+    return _submit_batch(lines, api_key)
+
+
+def submit_structured_batch(ocr_texts: List[str], api_key: str) -> str | None:
+    """
+    Submit structured parsing for uncached OCR texts as one OpenAI Batch API job.
+
+    Returns the batch id, or None when every text is already cached.
+    """
+    lines: List[bytes] = []
+    seen: set[str] = set()
+    for ocr_text in ocr_texts:
+        if not (ocr_text or "").strip():
+            continue
+        cache_path = structured_cache_path(ocr_text)
+        if cache_path.stem in seen or _read_structured_cache(cache_path) is not None:
+            continue
+        seen.add(cache_path.stem)
+        request_kwargs = _structured_request_kwargs(_structured_user_prompt(ocr_text))
+        lines.append(_batch_request_line(f"{_STRUCTURED_BATCH_PREFIX}{cache_path.stem}", request_kwargs))
+    return _submit_batch(lines, api_key)
+
+
+def collect_batch_results(batch_id: str, api_key: str) -> int | None:
+    """
+    Write a finished batch's outputs into the vision and structured caches.
+
+    Returns the number of cache entries written, or None while the batch is
+    still running. Responses that fail to parse are skipped, leaving the sync
+    path (with its repair retry) to handle them.
+
+    Raises:
+        LLMParseError: If the batch ended without any output file.
+    """
+    client = _get_client(api_key)
+    batch = client.batches.retrieve(batch_id)
+    if batch.status not in _BATCH_TERMINAL_STATUSES:
+        return None
+    if not batch.output_file_id:
+        raise LLMParseError(f"Batch {batch_id} ended with status '{batch.status}' and no output.")
+
+    output = client.files.content(batch.output_file_id).content
+    written = 0
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        choices = (response.get("body") or {}).get("choices") or []
+        if not choices:
+            continue
+        raw_text = (choices[0].get("message") or {}).get("content")
+        custom_id = str(record.get("custom_id") or "")
+        if custom_id.startswith(_VISION_BATCH_PREFIX):
+            cache_path = VISION_CACHE_DIR / f"{custom_id[len(_VISION_BATCH_PREFIX):]}.txt"
+            if _store_vision_text(cache_path, raw_text):
+                written += 1
+        elif custom_id.startswith(_STRUCTURED_BATCH_PREFIX):
+            try:
+                normalized = _normalize_structured_invoice(_safe_parse_json(raw_text or ""))
+            except LLMParseError:
+                continue
+            cache_path = STRUCTURED_CACHE_DIR / f"{custom_id[len(_STRUCTURED_BATCH_PREFIX):]}.json"
+            _write_structured_cache(cache_path, normalized)
+            written += 1
+    return written
+
+
+def _batch_request_line(custom_id: str, body: Dict[str, Any]) -> bytes:
+    return orjson.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": body,
+    })
+
+
+def _submit_batch(lines: List[bytes], api_key: str) -> str | None:
+    """Upload JSONL request lines and create a 24h chat completions batch."""
+    if not lines:
+        return None
+    client = _get_client(api_key)
+    input_file = client.files.create(
+        file=("invoice_batch.jsonl", b"\n".join(lines) + b"\n"),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
 def _safe_parse_json(raw_output: str) -> Dict[str, Any]:
     """
     Parse model output into a dict with recovery for common formatting wrappers.
@@ -195,19 +562,19 @@ def _safe_parse_json(raw_output: str) -> Dict[str, Any]:
 
     cleaned = _strip_markdown_fences(raw_output.strip())
     try:
-        parsed = json.loads(cleaned)
+        parsed = orjson.loads(cleaned)
         if not isinstance(parsed, dict):
             raise LLMParseError(_format_parse_error("invalid-json", raw_output, "Top-level JSON must be an object."))
         return parsed
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         pass
 
     extracted = _extract_json_object(cleaned)
     if extracted is None:
         raise LLMParseError(_format_parse_error("no-json", raw_output, "No JSON object found in model output."))
     try:
-        parsed = json.loads(extracted)
-    except json.JSONDecodeError as exc:
+        parsed = orjson.loads(extracted)
+    except orjson.JSONDecodeError as exc:
         raise LLMParseError(
             _format_parse_error("invalid-json", raw_output, f"Invalid JSON after cleanup: {exc}")
         ) from exc
@@ -220,21 +587,34 @@ def _strip_markdown_fences(text: str) -> str:
     """Strip leading/trailing markdown code fences if present."""
     if not text.startswith("```"):
         return text
-    lines = text.splitlines()
-    if not lines:
-        return text
-    if lines[0].startswith("```"):
-        lines = lines[1:]
-    if lines and lines[-1].strip().startswith("```"):
-        lines = lines[:-1]
-    return "\n".join(lines).strip()
+    # Skip the opening fence line, including any language tag such as ```json.
+    start = text.find("\n") + 1
+    if start == 0:
+        return ""
+    end = text.rfind("```")
+    if end >= start and not text[end + 3:].strip():
+        return text[start:end].strip()
+    return text[start:].strip()
 
 
 def _extract_json_object(text: str) -> str | None:
-    """Extract substring spanning first '{' to last '}'."""
+    """
+    Extract the first complete JSON object starting at the first '{'.
+
+    The C scanner stops at the object's closing brace, so trailing prose or a
+    second object does not spoil the span. Falls back to first '{' .. last '}'
+    when no complete object decodes from there.
+    """
     start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        _, end = _JSON_OBJECT_DECODER.raw_decode(text, start)
+        return text[start:end]
+    except json.JSONDecodeError:
+        pass
     end = text.rfind("}")
-    if start == -1 or end == -1 or end < start:
+    if end < start:
         return None
     return text[start : end + 1].strip()
 
@@ -247,7 +627,7 @@ def _format_parse_error(category: str, raw_output: str, detail: str) -> str:
 
 def _preview_text(text: str, limit: int = 300) -> str:
     """Normalize and truncate preview text for diagnostics."""
-    compact = (text or "").replace("\r", "\\r").replace("\n", "\\n").strip()
+    compact = (text or "").translate(_PREVIEW_TABLE).strip()
     if len(compact) <= limit:
         return compact
     return compact[:limit] + "...(truncated)"
@@ -260,29 +640,17 @@ def _normalize_structured_invoice(parsed: Dict[str, Any]) -> Dict[str, Any]:
     if not isinstance(parsed, dict):
         raise LLMParseError("Model response is not a JSON object.")
 
-    normalized: Dict[str, Any] = {
-        "vendor_name": parsed.get("vendor_name"),
-        "invoice_number": parsed.get("invoice_number"),
-        "invoice_date": parsed.get("invoice_date"),
-        "due_date": parsed.get("due_date"),
-        "total_amount": parsed.get("total_amount"),
-        "service_address": parsed.get("service_address"),
-        "account_number": parsed.get("account_number"),
-        "line_items": [],
-    }
-
-    amount = normalized.get("total_amount")
-    if amount is not None:
-        try:
-            normalized["total_amount"] = float(amount)
-        except (TypeError, ValueError):
-            normalized["total_amount"] = None
-
-    for key in ("vendor_name", "invoice_number", "invoice_date", "due_date", "service_address", "account_number"):
-        value = normalized.get(key)
+    normalized: Dict[str, Any] = {}
+    for key in _STRUCTURED_FIELDS:
+        value = parsed.get(key)
         if value is None:
-            continue
-        text_value = str(value).strip()
-        normalized[key] = text_value if text_value else None
-
-    return normalized
\ No newline at end of file
+            normalized[key] = None
+        elif key == "total_amount":
+            try:
+                normalized[key] = float(value)
+            except (TypeError, ValueError):
+                normalized[key] = None
+        else:
+            normalized[key] = str(value).strip() or None
+    normalized["line_items"] = []
+    return normalized
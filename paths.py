@@ -1,5 +1,6 @@
 """Centralized filesystem paths for SQLite-backed data and configs."""
 
+import functools
 from pathlib import Path
 
 
@@ -10,6 +11,7 @@ LEDGER_DB_PATH = DATA_DIR / "ledger.db"
 
 CACHE_DIR = DATA_DIR / "cache"
 VISION_CACHE_DIR = CACHE_DIR / "vision_text"
+STRUCTURED_CACHE_DIR = CACHE_DIR / "structured"
 DEBUG_DIR = DATA_DIR / "debug"
 STRUCTURED_OUTPUTS_DIR = DEBUG_DIR / "structured_outputs"
 
@@ -20,10 +22,17 @@ DYNAMIC_RULES_PATH = CONFIG_DIR / "dynamic_rules.json"
 INVOICES_DIR = BASE_DIR / "invoices"
 
 
+# Leaf directories; parents=True creates DATA_DIR, CACHE_DIR and DEBUG_DIR on the way.
+_DATA_LEAF_DIRS = (VISION_CACHE_DIR, STRUCTURED_CACHE_DIR, STRUCTURED_OUTPUTS_DIR)
+
+
+@functools.lru_cache(maxsize=1)
 def ensure_data_dirs() -> None:
-    """Ensure required data directories exist."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    VISION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    DEBUG_DIR.mkdir(parents=True, exist_ok=True)
-    STRUCTURED_OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
+    """
+    Ensure required data directories exist.
+
+    Runs once per process; later calls (e.g. one per API ingest request) are
+    no-ops. Cache and output writers recreate a directory removed afterwards.
+    """
+    for directory in _DATA_LEAF_DIRS:
+        directory.mkdir(parents=True, exist_ok=True)
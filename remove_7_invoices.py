@@ -5,7 +5,7 @@ re-run individually as if for the first time.
 from pathlib import Path
 
 from core.db import get_connection, init_db
-from paths import VISION_CACHE_DIR
+from llm_parser import legacy_vision_cache_path, vision_cache_path
 
 FILES_TO_REMOVE = [
     "WEllis_GP_12-31-25.pdf",
@@ -22,59 +22,39 @@ def main() -> None:
     init_db()
     with get_connection() as conn:
         placeholders = ",".join("?" * len(FILES_TO_REMOVE))
-        doc_ids = [
-            row[0]
-            for row in conn.execute(
-                f"SELECT doc_id FROM documents WHERE file_name IN ({placeholders})",
-                FILES_TO_REMOVE,
-            ).fetchall()
-        ]
+        rows = conn.execute(
+            f"SELECT doc_id, file_path FROM documents WHERE file_name IN ({placeholders})",
+            FILES_TO_REMOVE,
+        ).fetchall()
+        doc_ids = [row[0] for row in rows]
+        file_paths = sorted({row[1] for row in rows if row[1]})
         if not doc_ids:
             print("No matching documents found.")
             return
         print(f"Found {len(doc_ids)} documents to remove: {doc_ids}")
 
+        # Child rows cascade (and duplicate_of_doc_id links are nulled) via
+        # the schema's ON DELETE actions; init_db migrates older ledgers.
         id_placeholders = ",".join("?" * len(doc_ids))
-        params = tuple(doc_ids)
-
-        conn.execute(
-            f"DELETE FROM transaction_line_items WHERE doc_id IN ({id_placeholders})",
-            params,
-        )
-        conn.execute(
-            f"DELETE FROM tagging_events WHERE doc_id IN ({id_placeholders})",
-            params,
-        )
-        conn.execute(
-            f"DELETE FROM manual_review_queue WHERE doc_id IN ({id_placeholders})",
-            params,
-        )
-        conn.execute(
-            f"DELETE FROM manual_review_decisions WHERE doc_id IN ({id_placeholders})",
-            params,
-        )
-        conn.execute(
-            f"UPDATE transactions SET duplicate_of_doc_id = NULL WHERE duplicate_of_doc_id IN ({id_placeholders})",
-            params,
-        )
-        conn.execute(
-            f"DELETE FROM transactions WHERE doc_id IN ({id_placeholders})",
-            params,
-        )
         conn.execute(
             f"DELETE FROM documents WHERE doc_id IN ({id_placeholders})",
-            params,
+            doc_ids,
         )
         conn.commit()
         print(f"Removed {len(doc_ids)} documents and related rows from DB.")
 
     removed_cache = 0
-    for fname in FILES_TO_REMOVE:
-        cache_path = VISION_CACHE_DIR / f"{fname}.txt"
-        if cache_path.exists():
-            cache_path.unlink()
-            removed_cache += 1
-            print(f"  Removed vision cache: {fname}.txt")
+    for file_path in file_paths:
+        cache_paths = [legacy_vision_cache_path(file_path)]
+        try:
+            cache_paths.append(vision_cache_path(file_path))
+        except OSError:
+            pass
+        for cache_path in cache_paths:
+            if cache_path.exists():
+                cache_path.unlink()
+                removed_cache += 1
+                print(f"  Removed vision cache: {Path(file_path).name} ({cache_path.name})")
     print(f"Removed {removed_cache} vision cache files.")
     print("Done. You can now re-run each file individually as if for the first time.")
 